@@ -1,3 +1,13 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 import csv
@@ -5,16 +15,552 @@ import matplotlib.pyplot as plt
 
 pd.set_option('display.max_columns', None)
 
+# Rows per chunk; memory use is bounded by roughly one chunk regardless of file size
+DEFAULT_CHUNKSIZE = 100_000
+ENGINES = ("c", "pyarrow")
+# Columnar cache: Arrow IPC files are memory-mapped on read, Parquet is smaller on disk
+FORMATS = ("arrow", "parquet")
+DEFAULT_CACHE_DIR = ".cache/columnar"
+MANIFEST = "_manifest.json"
+# String columns whose distinct/total ratio in the first chunk is below this are dictionary-encoded
+DICTIONARY_RATIO = 0.5
+
+
+def load_data(file_path, usecols=None, dtype=None):
+    # Use a literal tab as the delimiter and disable quoting. Column types are inferred unless
+    # dtype is given. Whole file in memory: use iter_chunks / load_filtered for multi-GB dumps
+    return pd.read_csv(file_path, sep='\t', engine='c', header=None, quoting=csv.QUOTE_NONE,
+                       usecols=usecols, dtype=dtype)
+
+
+def column_count(file_path):
+    """Number of tab-separated columns in the file's first line."""
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        return f.readline().count('\t') + 1
+
+
+def _string_dtype():
+    # Module level so a parse_dtypes result pickles into ingest's worker processes
+    return str
+
+
+def parse_dtypes(items):
+    """{column: dtype} from COL=TYPE strings, TYPE being str or a numpy dtype name (int64, float32, bool, ...).
+
+    Returns a defaultdict so columns that are not listed stay strings.
+    """
+    dtype = defaultdict(_string_dtype)
+    for item in items:
+        col, name = item.split("=", 1)
+        dtype[int(col)] = str if name == "str" else np.dtype(name)
+    return dtype
+
+
+def _dtype_spec(dtype):
+    """JSON-friendly description of a dtype argument, for cache keys and manifests."""
+    def name(t):
+        return "str" if t is str else np.dtype(t).name
+
+    if isinstance(dtype, dict):
+        spec = {str(col): name(t) for col, t in sorted(dtype.items())}
+        if isinstance(dtype, defaultdict):
+            spec["*"] = name(dtype.default_factory())
+        return spec
+    return name(dtype) if dtype is not None else None
+
+
+def _iter_c_chunks(file_path, chunksize, usecols, dtype):
+    reader = pd.read_csv(
+        file_path, sep='\t', engine='c', header=None, quoting=csv.QUOTE_NONE,
+        usecols=usecols, dtype=dtype, chunksize=chunksize, low_memory=True
+    )
+    with reader:
+        yield from reader
+
+
+def _iter_arrow_chunks(file_path, chunksize, usecols, dtype):
+    # pandas' pyarrow engine cannot stream, so read record batches with pyarrow.csv directly
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    # Without a header pyarrow names columns f0, f1, ...; map back to the integer labels pandas uses
+    if usecols is None:
+        usecols = range(column_count(file_path))
+    include = [f"f{i}" for i in usecols]
+    if isinstance(dtype, dict):
+        types = {f"f{col}": t for col, t in dtype.items()}
+    else:
+        types = dict.fromkeys(include, dtype)
+    column_types = {name: pa.string() if t is str else pa.from_numpy_dtype(np.dtype(t))
+                    for name, t in types.items() if t is not None}
+
+    read_options = pv.ReadOptions(autogenerate_column_names=True, block_size=1 << 24)
+    parse_options = pv.ParseOptions(delimiter='\t', quote_char=False)
+    convert_options = pv.ConvertOptions(include_columns=include, column_types=column_types,
+                                        strings_can_be_null=False)
+    with pv.open_csv(file_path, read_options=read_options, parse_options=parse_options,
+                     convert_options=convert_options) as reader:
+        for batch in reader:
+            df = batch.to_pandas()
+            df.columns = [int(name[1:]) for name in df.columns]
+            for start in range(0, len(df), chunksize):
+                yield df.iloc[start:start + chunksize]
+
+
+def iter_chunks(file_path, chunksize=DEFAULT_CHUNKSIZE, usecols=None, dtype=str, row_filter=None,
+                engine="c", stats=None):
+    """Stream a tab-delimited file as DataFrame chunks.
+
+    usecols: integer column positions to keep (projection happens in the parser)
+    dtype: str, a numpy dtype or a {column: dtype} dict; explicit types skip inference.
+        A defaultdict (see parse_dtypes) supplies the type of every column it does not list
+    row_filter: callable(chunk) -> boolean mask, applied to every chunk before it is yielded
+    stats: optional dict updated in place with rows_read, rows_kept and chunks
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if usecols is not None:
+        usecols = sorted(usecols)
+    if isinstance(dtype, defaultdict):
+        # pandas does not apply a defaultdict's default to integer column labels, so list every column
+        dtype = {col: dtype[col] for col in (usecols if usecols is not None else range(column_count(file_path)))}
+    chunks = _iter_c_chunks if engine == "c" else _iter_arrow_chunks
+    if stats is not None:
+        stats.update(rows_read=0, rows_kept=0, chunks=0)
+
+    for chunk in chunks(file_path, chunksize, usecols, dtype):
+        rows = len(chunk)
+        if row_filter is not None:
+            chunk = chunk[row_filter(chunk)]
+        if stats is not None:
+            stats["rows_read"] += rows
+            stats["rows_kept"] += len(chunk)
+            stats["chunks"] += 1
+        yield chunk
+
+
+def load_filtered(file_path, report=True, **kwargs):
+    """Concatenate the filtered chunks of iter_chunks; only kept rows are held in memory."""
+    stats = {}
+    start = time.perf_counter()
+    kept = list(iter_chunks(file_path, stats=stats, **kwargs))
+    elapsed = time.perf_counter() - start
+    df = pd.concat(kept, ignore_index=True) if kept else pd.DataFrame()
+    if report:
+        report_throughput(file_path, stats, elapsed)
+    return df
+
+
+def report_throughput(file_path, stats, elapsed):
+    size_mb = os.path.getsize(file_path) / 1e6
+    elapsed = max(elapsed, 1e-9)
+    print(f"[LOAD] {file_path}: {stats['rows_read']:,} rows in {stats['chunks']} chunks, "
+          f"{stats['rows_kept']:,} kept, {elapsed:.2f}s "
+          f"({size_mb / elapsed:.1f} MB/s, {stats['rows_read'] / elapsed:,.0f} rows/s)")
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_signature(file_path, verify):
+    stat = os.stat(file_path)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if verify == "hash":
+        signature["sha256"] = file_sha256(file_path)
+    return signature
+
+
+def columnar_cache_path(file_path, cache_dir=DEFAULT_CACHE_DIR, usecols=None, fmt="arrow", dtype=str):
+    """Cache directory for a source file; keyed by its absolute path, projected columns, format and dtypes."""
+    parts = [os.path.abspath(file_path), sorted(usecols) if usecols else None, fmt]
+    if dtype is not str:
+        parts.append(_dtype_spec(dtype))
+    key = hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(file_path)}-{key}")
+
+
+def _arrow_schema(chunk):
+    """Arrow schema for a chunk: low-cardinality string columns become dictionary<int32, string>."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    fields = []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            distinct = len(column.unique())
+            if len(column) and distinct / len(column) < DICTIONARY_RATIO:
+                field = pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+            else:
+                field = pa.field(field.name, pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def convert(file_path, cache_dir=DEFAULT_CACHE_DIR, fmt="arrow", chunksize=DEFAULT_CHUNKSIZE, usecols=None,
+            dtype=str, engine="c", verify="mtime", partition_rows=1_000_000):
+    """Parse a tab-delimited file once into partitioned Arrow IPC or Parquet files.
+
+    Columns are typed from ``dtype`` and repetitive string columns are
+    dictionary-encoded. Up to ``partition_rows`` rows are buffered per
+    output file. A manifest records the source's size and mtime
+    (plus its sha256 when ``verify="hash"``) so load_columnar can tell when
+    the cache is stale. Returns the cache directory.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+    path = columnar_cache_path(file_path, cache_dir, usecols, fmt, dtype)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
 
-def load_data(file_path):
-    # Use a literal tab as the delimiter and disable quoting
-    return pd.read_csv(file_path, sep='\t', engine='python', header=None, quoting=csv.QUOTE_NONE)
+    signature = _source_signature(file_path, verify)
+    stats = {}
+    start = time.perf_counter()
+    schema = None
+    partitions = []
+    pending = []
+    pending_rows = 0
 
+    def write_partition():
+        # Arrow IPC files allow one dictionary per column, so a partition's chunks share unified dictionaries
+        table = pa.concat_tables(pending).unify_dictionaries()
+        name = f"part-{len(partitions):05d}.{fmt}"
+        target = os.path.join(tmp_path, name)
+        if fmt == "arrow":
+            with ipc.new_file(target, schema) as writer:
+                writer.write_table(table)
+        else:
+            pq.write_table(table, target)
+        partitions.append({"file": name, "rows": len(table)})
+        pending.clear()
 
+    for chunk in iter_chunks(file_path, chunksize=chunksize, usecols=usecols, dtype=dtype, engine=engine,
+                             stats=stats):
+        chunk.columns = [str(c) for c in chunk.columns]
+        if schema is None:
+            schema = _arrow_schema(chunk)
+        pending.append(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        pending_rows += len(chunk)
+        if pending_rows >= partition_rows:
+            write_partition()
+            pending_rows = 0
+    if pending:
+        write_partition()
+
+    with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+        json.dump({
+            "source": os.path.abspath(file_path),
+            "source_signature": signature,
+            "format": fmt,
+            "dtype": _dtype_spec(dtype),
+            "columns": [field.name for field in schema] if schema else [],
+            "dictionary_columns": [field.name for field in schema or [] if pa.types.is_dictionary(field.type)],
+            "rows": stats.get("rows_read", 0),
+            "partitions": partitions
+        }, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+    elapsed = time.perf_counter() - start
+    print(f"[CONVERT] {file_path} -> {path}: {stats.get('rows_read', 0):,} rows, {len(partitions)} partition(s), "
+          f"{elapsed:.2f}s")
+    return path
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_is_fresh(manifest, file_path, verify="mtime"):
+    """True when the source still matches the size/mtime (and sha256 for verify="hash") it was converted from."""
+    if manifest is None:
+        return False
+    recorded = manifest["source_signature"]
+    stat = os.stat(file_path)
+    if stat.st_size != recorded["size"]:
+        return False
+    if verify == "hash":
+        return recorded.get("sha256") == file_sha256(file_path)
+    return stat.st_mtime_ns == recorded["mtime_ns"]
+
+
+def load_columnar(file_path, columns=None, cache_dir=DEFAULT_CACHE_DIR, fmt="arrow", usecols=None,
+                  verify="mtime", dtype=str, **convert_kwargs):
+    """Load a source file through its columnar cache, converting first if it is missing or stale.
+
+    columns: integer column positions to read; other columns are never touched
+    Arrow partitions are memory-mapped, so repeat loads are bounded by the
+    selected columns rather than by parsing.
+    """
+    path = columnar_cache_path(file_path, cache_dir, usecols, fmt, dtype)
+    if not cache_is_fresh(read_manifest(path), file_path, verify):
+        convert(file_path, cache_dir, fmt, usecols=usecols, dtype=dtype, verify=verify, **convert_kwargs)
+
+    return read_columnar(path, columns)
+
+
+def _read_partition(path, part, fmt, names=None):
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    target = os.path.join(path, part["file"])
+    if fmt == "arrow":
+        with pa.memory_map(target) as source:
+            table = ipc.open_file(source).read_all()
+        return table.select(names) if names else table
+    return pq.read_table(target, columns=names, memory_map=True)
+
+
+def read_columnar(path, columns=None):
+    """Read a converted (or ingested) cache directory into a DataFrame without touching the source."""
+    import pyarrow as pa
+
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST} in {path}")
+    names = [str(c) for c in columns] if columns is not None else None
+    tables = [_read_partition(path, part, manifest["format"], names) for part in manifest["partitions"]]
+    if not tables:
+        return pd.DataFrame()
+    df = pa.concat_tables(tables).to_pandas()
+    df.columns = [int(c) if c.isdigit() else c for c in df.columns]
+    return df
+
+
+def expand_inputs(patterns):
+    """Files matching a list of paths and/or glob patterns, in sorted order without duplicates."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No files match {pattern!r}")
+        paths.extend(m for m in matches if m not in paths)
+    return paths
+
+
+def _ingest_one(file_path, cache_dir, fmt, usecols, engine, verify, dtype):
+    # Runs in a worker process: bring one file's columnar cache up to date and report on it
+    start = time.perf_counter()
+    path = columnar_cache_path(file_path, cache_dir, usecols, fmt, dtype)
+    reused = cache_is_fresh(read_manifest(path), file_path, verify)
+    if not reused:
+        convert(file_path, cache_dir, fmt, usecols=usecols, dtype=dtype, engine=engine, verify=verify)
+    seconds = time.perf_counter() - start
+    size_mb = os.path.getsize(file_path) / 1e6
+    return {
+        "file": file_path,
+        "cache": path,
+        "reused_cache": reused,
+        "rows": read_manifest(path)["rows"],
+        "size_mb": round(size_mb, 2),
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(size_mb / max(seconds, 1e-9), 1)
+    }
+
+
+def _shared_schema(schemas):
+    """Union of columns across files; a column typed differently in different files falls back to string."""
+    import pyarrow as pa
+
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            seen = fields.get(field.name)
+            if seen is None:
+                fields[field.name] = field.type
+            elif seen != field.type:
+                both_strings = all(pa.types.is_string(t) or pa.types.is_dictionary(t) for t in (seen, field.type))
+                fields[field.name] = pa.dictionary(pa.int32(), pa.string()) if both_strings and (
+                    pa.types.is_dictionary(seen) or pa.types.is_dictionary(field.type)) else pa.string()
+    names = sorted(fields, key=lambda name: (not name.isdigit(), int(name) if name.isdigit() else name))
+    return pa.schema([pa.field(name, fields[name]) for name in names] +
+                     [pa.field("source_file", pa.dictionary(pa.int32(), pa.string()))])
+
+
+def _conform(table, schema, source_file):
+    import pyarrow as pa
+
+    columns = []
+    for field in schema:
+        if field.name == "source_file":
+            column = pa.DictionaryArray.from_arrays(pa.array([0] * len(table), pa.int32()), pa.array([source_file]))
+        elif field.name in table.column_names:
+            column = table[field.name]
+            if column.type != field.type:
+                column = column.cast(field.type)
+        else:
+            column = pa.nulls(len(table), field.type)
+        columns.append(column)
+    # Casting a multi-chunk column to dictionary encodes each chunk separately; an IPC file
+    # allows one dictionary per column, so unify them as convert() does
+    return pa.Table.from_arrays(columns, schema=schema).unify_dictionaries()
+
+
+def ingest(patterns, out_dir, workers=None, cache_dir=DEFAULT_CACHE_DIR, fmt="arrow", usecols=None, engine="c",
+           verify="mtime", dtype=str):
+    """Parse many dumps concurrently and merge them into one columnar dataset.
+
+    Each file is converted to its own columnar cache in a process pool
+    (unchanged files reuse their cache), then the parent conforms every
+    partition to a shared schema, tags rows with a ``source_file`` column
+    and writes the merged partitions plus a manifest with per-file stats
+    to ``out_dir``. Load the result with read_columnar(out_dir).
+    """
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    paths = expand_inputs(patterns)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_ingest_one, path, cache_dir, fmt, usecols, engine, verify, dtype) for path in paths]
+        file_stats = [future.result() for future in futures]
+    parsed = time.perf_counter() - start
+
+    parts = [(stats, part) for stats in file_stats for part in read_manifest(stats["cache"])["partitions"]]
+    schema = _shared_schema(_read_partition(stats["cache"], part, fmt).schema for stats, part in parts)
+
+    tmp_path = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    partitions = []
+    for stats, part in parts:
+        table = _conform(_read_partition(stats["cache"], part, fmt), schema, stats["file"])
+        name = f"part-{len(partitions):05d}.{fmt}"
+        if fmt == "arrow":
+            with ipc.new_file(os.path.join(tmp_path, name), schema) as writer:
+                writer.write_table(table)
+        else:
+            pq.write_table(table, os.path.join(tmp_path, name))
+        partitions.append({"file": name, "rows": len(table), "source": stats["file"]})
+
+    elapsed = time.perf_counter() - start
+    total_rows = sum(stats["rows"] for stats in file_stats)
+    total_mb = sum(stats["size_mb"] for stats in file_stats)
+    with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+        json.dump({
+            "sources": file_stats,
+            "format": fmt,
+            "dtype": _dtype_spec(dtype),
+            "columns": schema.names,
+            "rows": total_rows,
+            "workers": workers,
+            "parse_seconds": round(parsed, 3),
+            "total_seconds": round(elapsed, 3),
+            "partitions": partitions
+        }, f, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_path, out_dir)
+
+    for stats in file_stats:
+        print(f"[INGEST] {stats['file']}: {stats['rows']:,} rows, {stats['size_mb']:.1f} MB, {stats['seconds']:.2f}s "
+              f"({stats['mb_per_s']:.1f} MB/s{', cached' if stats['reused_cache'] else ''})")
+    print(f"[INGEST] {len(paths)} file(s), {total_rows:,} rows -> {out_dir} with {workers} worker(s): "
+          f"parse {parsed:.2f}s, total {elapsed:.2f}s ({total_mb / max(elapsed, 1e-9):.1f} MB/s)")
+    return out_dir
+
+def equals_filter(conditions):
+    """Row filter keeping rows where every column == value, from {column: value}."""
+    def row_filter(chunk):
+        mask = np.ones(len(chunk), dtype=bool)
+        for column, value in conditions.items():
+            mask &= (chunk[column] == value).to_numpy()
+        return mask
+    return row_filter
 
 
 if __name__ == '__main__':
-    d_s_1 = '/Users/odagled/Desktop/UCD/SPRING25/DATASCIENCE/Car_App/Data/FLAT_CMPL.txt'
-    d_s_2 = '/Users/odagled/Desktop/UCD/SPRING25/DATASCIENCE/Car_App/Data/FLAT_CMPL.txt'
-    d_s_p = '/Users/odagled/Desktop/UCD/SPRING25/DATASCIENCE/Car_App/Data/FLAT_CMPL.txt'
-    d_ds = '/Users/odagled/Desktop/UCD/SPRING25/DATASCIENCE/Car_App/Data/FLAT_CMPL.txt'
+    parser = argparse.ArgumentParser(description="Load tab-delimited dumps (e.g. FLAT_CMPL.txt)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_load = sub.add_parser("load", help="Stream the raw file in chunks")
+    p_load.add_argument("path", help="Tab-delimited file without a header row")
+    p_load.add_argument("--usecols", type=int, nargs="+", help="Column positions to keep")
+    p_load.add_argument("--where", nargs="+", default=[], metavar="COL=VALUE",
+                        help="Keep only rows where column COL equals VALUE")
+    p_load.add_argument("--dtype", nargs="+", default=[], metavar="COL=TYPE",
+                        help="Type of column COL: str or a numpy dtype such as int64 (other columns: str)")
+    p_load.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    p_load.add_argument("--engine", choices=ENGINES, default="c", help="Parser engine")
+
+    p_convert = sub.add_parser("convert", help="Write the file once to a partitioned columnar cache")
+    p_convert.add_argument("path", help="Tab-delimited file without a header row")
+    p_convert.add_argument("--format", choices=FORMATS, default="arrow", help="Cache file format")
+    p_convert.add_argument("--usecols", type=int, nargs="+", help="Column positions to keep")
+    p_convert.add_argument("--dtype", nargs="+", default=[], metavar="COL=TYPE",
+                           help="Type of column COL: str or a numpy dtype such as int64 (other columns: str)")
+    p_convert.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where cached partitions are written")
+    p_convert.add_argument("--partition-rows", type=int, default=1_000_000, help="Rows per partition file")
+    p_convert.add_argument("--engine", choices=ENGINES, default="c", help="Parser engine")
+    p_convert.add_argument("--verify", choices=("mtime", "hash"), default="mtime",
+                           help="How later loads check the cache against the source")
+
+    p_read = sub.add_parser("read", help="Load through the columnar cache (converting if stale)")
+    p_read.add_argument("path", help="Tab-delimited file without a header row")
+    p_read.add_argument("--columns", type=int, nargs="+", help="Column positions to read")
+    p_read.add_argument("--format", choices=FORMATS, default="arrow", help="Cache file format")
+    p_read.add_argument("--usecols", type=int, nargs="+", help="Column positions the cache was converted with")
+    p_read.add_argument("--dtype", nargs="+", default=[], metavar="COL=TYPE",
+                        help="Column types the cache was converted with (see convert --dtype)")
+    p_read.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where cached partitions are written")
+    p_read.add_argument("--verify", choices=("mtime", "hash"), default="mtime",
+                        help="How the cache is checked against the source")
+    p_ingest = sub.add_parser("ingest", help="Parse many files in parallel into one merged columnar dataset")
+    p_ingest.add_argument("inputs", nargs="+", help="Files and/or glob patterns, e.g. 'Data/FLAT_*.txt'")
+    p_ingest.add_argument("--out", required=True, help="Directory for the merged dataset")
+    p_ingest.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    p_ingest.add_argument("--format", choices=FORMATS, default="arrow", help="Cache file format")
+    p_ingest.add_argument("--usecols", type=int, nargs="+", help="Column positions to keep")
+    p_ingest.add_argument("--dtype", nargs="+", default=[], metavar="COL=TYPE",
+                          help="Type of column COL: str or a numpy dtype such as int64 (other columns: str)")
+    p_ingest.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Where per-file caches are written")
+    p_ingest.add_argument("--engine", choices=ENGINES, default="c", help="Parser engine")
+    p_ingest.add_argument("--verify", choices=("mtime", "hash"), default="mtime",
+                          help="How per-file caches are checked against their source")
+    args = parser.parse_args()
+    try:
+        dtype = parse_dtypes(args.dtype) if args.dtype else str
+    except (ValueError, TypeError) as e:
+        parser.error(f"--dtype: {e}")
+
+    if args.command == "load":
+        conditions = {int(col): value for col, value in (item.split("=", 1) for item in args.where)}
+        if dtype is not str:
+            # Compare typed columns against typed values
+            conditions = {col: value if dtype[col] is str else dtype[col].type(value)
+                          for col, value in conditions.items()}
+        df = load_filtered(
+            args.path,
+            chunksize=args.chunksize,
+            usecols=args.usecols,
+            dtype=dtype,
+            row_filter=equals_filter(conditions) if conditions else None,
+            engine=args.engine
+        )
+        print(df.head())
+    elif args.command == "convert":
+        convert(args.path, args.cache_dir, args.format, usecols=args.usecols, dtype=dtype, engine=args.engine,
+                verify=args.verify, partition_rows=args.partition_rows)
+    elif args.command == "read":
+        start = time.perf_counter()
+        df = load_columnar(args.path, args.columns, args.cache_dir, args.format, usecols=args.usecols,
+                           verify=args.verify, dtype=dtype)
+        print(f"[READ] {len(df):,} rows x {len(df.columns)} columns in {time.perf_counter() - start:.3f}s")
+        print(df.head())
+    elif args.command == "ingest":
+        ingest(args.inputs, args.out, args.workers, args.cache_dir, args.format, usecols=args.usecols,
+               engine=args.engine, verify=args.verify, dtype=dtype)
@@ -1,24 +1,36 @@
 #!/usr/bin/env python3
 import argparse
+import csv
+import hashlib
+import inspect
+import json
 import os
+import re
+import shutil
+import socket
+import sys
+import time
+from functools import lru_cache
 
 import numpy as np
-import pandas as pd
-import torch
-from sklearn.preprocessing import MultiLabelBinarizer
-from sklearn.model_selection import train_test_split
-from datasets import Dataset
-from evaluate import load  # Changed from load_metric
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    Trainer,
-    TrainingArguments
-)
+
+# torch, transformers, datasets, evaluate, sklearn and pandas are imported inside the
+# functions that need them, so `--help`, `predict --daemon` and importing this module
+# stay fast; see IMPORT_BUDGET_SECONDS and the check-import subcommand
+HEAVY_MODULES = ("torch", "transformers", "datasets", "evaluate", "sklearn", "pandas")
+IMPORT_BUDGET_SECONDS = 0.5
+DAEMON_SOCKET = os.getenv("MODEL_DAEMON_SOCKET", "/tmp/disease-predictor.sock")
+
+BASE_MODEL = "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract"
 
 
 # 1) Load & prepare data: binarize labels, split, wrap as HF Datasets
-def load_and_prepare(csv_path):
+def load_and_prepare(csv_path, seed=42):
+    import pandas as pd
+    from datasets import Dataset
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import MultiLabelBinarizer
+
     # --- load raw CSV ---
     df = pd.read_csv(csv_path).drop(columns=["Unnamed: 0"], errors="ignore")
     # ensure we have `text` & `label` columns
@@ -41,7 +53,7 @@ def load_and_prepare(csv_path):
 
     # --- train/test split ---
     train_df, eval_df = train_test_split(
-        df, test_size=0.2, random_state=42, stratify=label_matrix
+        df, test_size=0.2, random_state=seed, stratify=label_matrix
     )
 
     # --- convert to HuggingFace Datasets ---
@@ -52,10 +64,10 @@ def load_and_prepare(csv_path):
 
 
 # 2) Tokenizer + preprocessing helper
+# No padding here: DataCollatorWithPadding pads each batch to its own longest row
 def preprocess_batch(batch, tokenizer, max_length=128):
     enc = tokenizer(
         batch["text"],
-        padding="max_length",
         truncation=True,
         max_length=max_length
     )
@@ -64,69 +76,246 @@ def preprocess_batch(batch, tokenizer, max_length=128):
     return enc
 
 
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prepare_datasets(csv_path, tokenizer, tokenizer_name=BASE_MODEL, max_length=128, seed=42,
+                     cache_dir=".cache/preprocessed"):
+    """Tokenized, label-encoded train/eval splits, cached on disk as Arrow.
+
+    The cache key covers the CSV contents, tokenizer, max_length and split
+    seed, so repeated runs (e.g. hyperparameter sweeps) memory-map the saved
+    splits instead of re-reading, re-binarizing and re-tokenizing the corpus.
+    Pass ``cache_dir=None`` to always rebuild.
+    """
+    from datasets import DatasetDict, load_from_disk
+
+    key = hashlib.sha256(
+        f"{file_sha256(csv_path)}|{tokenizer_name}|{max_length}|{seed}".encode()
+    ).hexdigest()[:16]
+    path = os.path.join(cache_dir, key) if cache_dir else None
+
+    if path and os.path.isdir(path):
+        print(f"[TRAIN] Reusing preprocessed splits from {path}")
+        splits = load_from_disk(path)
+        with open(os.path.join(path, "diseases.txt")) as f:
+            diseases = f.read().splitlines()
+        return splits["train"], splits["eval"], diseases
+
+    print(f"[TRAIN] Loading data from {csv_path}")
+    train_ds, eval_ds, diseases = load_and_prepare(csv_path, seed)
+    splits = DatasetDict({
+        "train": train_ds.map(lambda b: preprocess_batch(b, tokenizer, max_length), batched=True),
+        "eval": eval_ds.map(lambda b: preprocess_batch(b, tokenizer, max_length), batched=True)
+    })
+
+    if path:
+        # Write to a temp dir first so an interrupted run never leaves a half-written cache
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        splits.save_to_disk(tmp_path)
+        with open(os.path.join(tmp_path, "diseases.txt"), "w") as f:
+            f.write("\n".join(diseases))
+        try:
+            os.replace(tmp_path, path)
+            print(f"[TRAIN] Cached preprocessed splits in {path}")
+        except OSError:
+            # A concurrent run with the same key finished first; its splits are identical
+            if not os.path.isdir(path):
+                raise
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            print(f"[TRAIN] Reusing preprocessed splits another run cached in {path}")
+        splits = load_from_disk(path)
+    return splits["train"], splits["eval"], diseases
+
+
 # 3) Metrics for Trainer (macro‑F1)
-# Changed from load_metric to load from evaluate
-metric_f1 = load("f1")
+@lru_cache(maxsize=1)
+def f1_metric():
+    """Loaded on first evaluation rather than at import time."""
+    from evaluate import load  # Changed from load_metric
+
+    return load("f1")
 
 
 def compute_metrics(pred):
-    logits = torch.tensor(pred.predictions)
-    probs = torch.sigmoid(logits)
-    y_pred = (probs >= 0.5).int().numpy()
+    probs = sigmoid(pred.predictions)
+    y_pred = (probs >= 0.5).astype(np.int32)
     y_true = pred.label_ids.astype(np.int32)  # Ensure labels are int type for metrics
-    f1 = metric_f1.compute(
+    f1 = f1_metric().compute(
         predictions=y_pred, references=y_true, average="macro"
     )["f1"]
     return {"f1_macro": f1}
 
 
 # 4) Train once, save model+tokenizer+diseases.txt
-def train(csv_path: str, output_dir: str):
-    print(f"[TRAIN] Loading data from {csv_path}")
-    train_ds, eval_ds, diseases = load_and_prepare(csv_path)
+# Options for train(); a profile supplies every option not passed explicitly
+TRAIN_DEFAULTS = {
+    "batch_size": 16,  # Adjust to your GPU/CPU capacity
+    "epochs": 4,
+    "grad_accum": 1,
+    "threads": None,  # torch intra-op threads (None: torch default)
+    "interop_threads": None,
+    "dataloader_workers": 0,
+    "bf16": "off",  # on, off or auto (use it when the hardware supports it)
+    "early_stopping": None  # patience in epochs without an f1_macro improvement
+}
+# CPU-only hosts: pin threads, overlap collation with compute, bf16 where the CPU has it
+# and stop once eval f1_macro stops improving
+TRAIN_PROFILES = {
+    "default": TRAIN_DEFAULTS,
+    "cpu": dict(TRAIN_DEFAULTS, epochs=6, grad_accum=2, threads="auto", interop_threads=1,
+                dataloader_workers=2, bf16="auto", early_stopping=2)
+}
+
+
+def available_cores():
+    """CPUs this process may run on (respects taskset/cgroup affinity where the OS exposes it)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def bf16_supported(device):
+    import torch
+
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    if device.type == "cpu":
+        try:
+            return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+        except (AttributeError, RuntimeError):
+            return False
+    return False
+
+
+def _epoch_report_callback(num_samples, report_path, config):
+    from transformers import TrainerCallback
+
+    class EpochReport(TrainerCallback):
+        """Writes samples/sec (and eval f1_macro when evaluated) per epoch to report_path."""
 
-    print("[TRAIN] Initializing tokenizer & model")
-    tokenizer = AutoTokenizer.from_pretrained(
-        "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract"
+        def __init__(self):
+            self.epochs = []
+            self._start = None
+
+        def on_epoch_begin(self, args, state, control, **kwargs):
+            self._start = time.perf_counter()
+
+        def on_epoch_end(self, args, state, control, **kwargs):
+            seconds = time.perf_counter() - self._start
+            self.epochs.append({
+                "epoch": len(self.epochs) + 1,
+                "seconds": round(seconds, 2),
+                "samples_per_sec": round(num_samples / seconds, 2)
+            })
+            print(f"[TRAIN] Epoch {len(self.epochs)}: {num_samples / seconds:.1f} samples/s ({seconds:.1f}s)")
+            self._write()
+
+        def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+            if self.epochs and metrics and "eval_f1_macro" in metrics:
+                self.epochs[-1]["eval_f1_macro"] = round(metrics["eval_f1_macro"], 4)
+                self._write()
+
+        def _write(self):
+            with open(report_path, "w") as f:
+                json.dump({"config": config, "train_samples": num_samples, "epochs": self.epochs}, f, indent=2)
+
+    return EpochReport()
+
+
+def train(csv_path: str, output_dir: str, max_length: int = 128, seed: int = 42,
+          cache_dir: str = ".cache/preprocessed", profile: str = "default", **options):
+    """Fine-tune BASE_MODEL; options override the chosen TRAIN_PROFILES entry (see TRAIN_DEFAULTS)."""
+    unknown = set(options) - set(TRAIN_DEFAULTS)
+    if unknown:
+        raise TypeError(f"Unknown training options: {', '.join(sorted(unknown))}")
+    config = dict(TRAIN_PROFILES[profile])
+    config.update({name: value for name, value in options.items() if value is not None})
+    if config["threads"] == "auto":
+        config["threads"] = available_cores()
+    if config["dataloader_workers"]:
+        # Forked dataloader workers and the Rust tokenizer's own pool would oversubscribe the cores
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    import torch
+    from transformers import (
+        AutoTokenizer,
+        AutoModelForSequenceClassification,
+        DataCollatorWithPadding,
+        EarlyStoppingCallback,
+        Trainer,
+        TrainingArguments
+    )
+
+    if config["threads"]:
+        torch.set_num_threads(config["threads"])
+    if config["interop_threads"]:
+        try:
+            torch.set_num_interop_threads(config["interop_threads"])
+        except RuntimeError:
+            # Only settable before torch starts its inter-op pool
+            print("[TRAIN] Inter-op threads already initialized; keeping torch's setting")
+
+    print("[TRAIN] Initializing tokenizer")
+    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
+    train_ds, eval_ds, diseases = prepare_datasets(
+        csv_path, tokenizer, BASE_MODEL, max_length, seed, cache_dir
     )
+
+    print("[TRAIN] Initializing model")
     model = AutoModelForSequenceClassification.from_pretrained(
-        "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract",
+        BASE_MODEL,
         num_labels=len(diseases),
         problem_type="multi_label_classification"
     )
 
-    # attach preprocessing
-    train_ds = train_ds.map(
-        lambda b: preprocess_batch(b, tokenizer),
-        batched=True
-    )
-    eval_ds = eval_ds.map(
-        lambda b: preprocess_batch(b, tokenizer),
-        batched=True
-    )
+    device = torch.device("cpu") if profile == "cpu" else select_device()
+    bf16 = config["bf16"] == "on" or (config["bf16"] == "auto" and bf16_supported(device))
+    print(f"[TRAIN] Using device: {device} ({profile} profile, threads={torch.get_num_threads()}, "
+          f"bf16={bf16}, batch {config['batch_size']}x{config['grad_accum']})")
+    model.to(device)
 
-    # Check if MPS (Apple M1/M2) is available, otherwise use CUDA or CPU
-    if torch.backends.mps.is_available():
-        device = torch.device("mps")
-    elif torch.cuda.is_available():
-        device = torch.device("cuda")
-    else:
-        device = torch.device("cpu")
+    # TrainingArguments renamed a few fields across transformers releases
+    fields = TrainingArguments.__dataclass_fields__
+    extra = {}
+    if device.type == "cpu":
+        extra["use_cpu" if "use_cpu" in fields else "no_cuda"] = True
+    callbacks = []
+    if config["early_stopping"]:
+        extra.update({
+            "eval_strategy" if "eval_strategy" in fields else "evaluation_strategy": "epoch",
+            "load_best_model_at_end": True,
+            "metric_for_best_model": "f1_macro",
+            "greater_is_better": True,
+            "save_total_limit": config["early_stopping"] + 1
+        })
+        callbacks.append(EarlyStoppingCallback(early_stopping_patience=config["early_stopping"]))
 
-    print(f"[TRAIN] Using device: {device}")
-    model.to(device)
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, "train_report.json")
+    callbacks.append(_epoch_report_callback(len(train_ds), report_path, dict(config, profile=profile, bf16=bf16)))
 
     # Train with Trainer API
     args = TrainingArguments(
         output_dir=output_dir,
         do_eval=True,
         save_strategy="epoch",
-        per_device_train_batch_size=16,  # Adjust to your GPU/CPU capacity
-        per_device_eval_batch_size=16,
-        num_train_epochs=4,
+        per_device_train_batch_size=config["batch_size"],
+        per_device_eval_batch_size=config["batch_size"],
+        gradient_accumulation_steps=config["grad_accum"],
+        num_train_epochs=config["epochs"],
         learning_rate=2e-5,
         weight_decay=0.01,
-        logging_steps=50
+        logging_steps=50,
+        bf16=bf16,
+        dataloader_num_workers=config["dataloader_workers"],
+        group_by_length=True,  # length-bucketed sampling keeps per-batch padding small
+        **extra
     )
 
     trainer = Trainer(
@@ -135,15 +324,17 @@ def train(csv_path: str, output_dir: str):
         train_dataset=train_ds,
         eval_dataset=eval_ds,
         tokenizer=tokenizer,
-        compute_metrics=compute_metrics
+        data_collator=DataCollatorWithPadding(tokenizer),
+        compute_metrics=compute_metrics,
+        callbacks=callbacks
     )
 
     print("[TRAIN] Starting training…")
     trainer.train()
 
-    # Save artifacts
-    os.makedirs(output_dir, exist_ok=True)
+    # Save artifacts (the best checkpoint when early stopping is on)
     print(f"[TRAIN] Saving model & tokenizer to {output_dir}")
+    model = trainer.model
     model.save_pretrained(output_dir)
     tokenizer.save_pretrained(output_dir)
 
@@ -151,42 +342,833 @@ def train(csv_path: str, output_dir: str):
     with open(os.path.join(output_dir, "diseases.txt"), "w") as f:
         f.write("\n".join(diseases))
 
+    print(f"[TRAIN] Per-epoch throughput written to {report_path}")
     print("[TRAIN] Done!")
 
 
-# 5) Predict CLI: loads saved model and prints top‑k diseases
-def predict(model_dir: str, prompt: str, k: int = 3):
-    print(f"[PREDICT] Loading model from {model_dir}")
-    tokenizer = AutoTokenizer.from_pretrained(model_dir)
-    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
-    diseases = open(os.path.join(model_dir, "diseases.txt")).read().splitlines()
+# 5) Predictor: loads saved model once and serves top‑k diseases
+def select_device():
+    import torch
 
     # Check if MPS (Apple M1/M2) is available, otherwise use CUDA or CPU
     if torch.backends.mps.is_available():
-        device = torch.device("mps")
-    elif torch.cuda.is_available():
-        device = torch.device("cuda")
+        return torch.device("mps")
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    return torch.device("cpu")
+
+
+def length_bucketed_batches(lengths, batch_size):
+    """Yield index arrays whose rows have similar lengths.
+
+    Sorting by length before chunking means each batch is padded only to the
+    length of its own longest row instead of the global maximum.
+    """
+    order = np.argsort(lengths, kind="stable")
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+# Inference backends: eager PyTorch fp32, or ONNX Runtime graphs written by `export`
+BACKENDS = ("torch", "onnx", "int8", "student")
+ONNX_FILES = {"onnx": "model.onnx", "int8": "model.int8.onnx"}
+# Distilled TF-IDF/linear student written by `distill`: weights + vocabulary/config
+STUDENT_FILES = {"weights": "student.npz", "config": "student.json"}
+_STUDENT_TOKEN = re.compile(r"(?u)\b\w\w+\b")  # sklearn's default token_pattern
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class StudentModel:
+    """TF-IDF n-grams into a linear layer, scored with NumPy only.
+
+    Reproduces sklearn's TfidfVectorizer(sublinear_tf=True, norm="l2")
+    transform for the saved vocabulary, so serving needs neither sklearn
+    nor transformers. Each text costs a regex pass plus a gather over the
+    weight rows of its n-grams.
+    """
+
+    def __init__(self, vocabulary, idf, coef, intercept, ngram_range=(1, 2)):
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.coef = np.asarray(coef, dtype=np.float32)  # (n_features, n_labels)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.ngram_range = tuple(ngram_range)
+
+    @classmethod
+    def load(cls, model_dir):
+        with open(os.path.join(model_dir, STUDENT_FILES["config"])) as f:
+            config = json.load(f)
+        weights = np.load(os.path.join(model_dir, STUDENT_FILES["weights"]))
+        return cls(config["vocabulary"], weights["idf"], weights["coef"], weights["intercept"], config["ngram_range"])
+
+    def save(self, model_dir, **extra):
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez(os.path.join(model_dir, STUDENT_FILES["weights"]), idf=self.idf, coef=self.coef,
+                 intercept=self.intercept)
+        with open(os.path.join(model_dir, STUDENT_FILES["config"]), "w") as f:
+            json.dump(dict(extra, ngram_range=list(self.ngram_range), vocabulary=vocabulary), f)
+
+    def terms(self, text):
+        tokens = _STUDENT_TOKEN.findall(text.lower())
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            if n == 1:
+                yield from tokens
+            else:
+                for i in range(len(tokens) - n + 1):
+                    yield " ".join(tokens[i:i + n])
+
+    def logits(self, texts):
+        out = np.tile(self.intercept, (len(texts), 1))
+        for row, text in enumerate(texts):
+            counts = {}
+            for term in self.terms(text):
+                index = self.vocabulary.get(term)
+                if index is not None:
+                    counts[index] = counts.get(index, 0) + 1
+            if not counts:
+                continue
+            index = np.fromiter(counts, dtype=np.int64, count=len(counts))
+            weight = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * self.idf[index]
+            weight /= np.linalg.norm(weight)
+            out[row] += weight @ self.coef[index]
+        return out
+
+
+class DiseasePredictor:
+    """Long-lived wrapper around a saved model directory.
+
+    Tokenizer, weights and diseases.txt are read once in the constructor, so
+    callers that keep the instance around (e.g. the FastAPI server) only pay
+    for tokenization and the forward pass on each request. ``backend`` picks
+    eager PyTorch, one of the ONNX Runtime graphs produced by ``export`` or
+    the TF-IDF/linear student produced by ``distill``.
+    """
+
+    def __init__(self, model_dir: str, device=None, max_length: int = 128, backend: str = "torch",
+                 num_threads: int = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        start = time.perf_counter()
+        self.model_dir = model_dir
+        self.max_length = max_length
+        self.backend = backend
+        with open(os.path.join(model_dir, "diseases.txt")) as f:
+            self.diseases = f.read().splitlines()
+
+        if backend == "student":
+            # Plain NumPy: no tokenizer, torch or ONNX Runtime
+            self.tokenizer = None
+            self.student = StudentModel.load(model_dir)
+            self.device = "cpu"
+        else:
+            from transformers import AutoTokenizer
+
+            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        if backend == "torch":
+            import torch
+            from transformers import AutoModelForSequenceClassification
+
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+            self.device = device or select_device()
+            self.model.to(self.device).eval()
+        elif backend in ONNX_FILES:
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            self.session = ort.InferenceSession(
+                os.path.join(model_dir, ONNX_FILES[backend]), options, providers=["CPUExecutionProvider"]
+            )
+            self._onnx_inputs = {i.name for i in self.session.get_inputs()}
+            self.device = "cpu"
+        self.load_time = time.perf_counter() - start
+        # Running count of token positions fed to the model, padding included
+        self.tokens_processed = 0
+        # Optional callable(stage, seconds) told how long "tokenize" and "forward" took per batch
+        self.timing_hook = None
+
+    def warmup(self):
+        """Run one throwaway forward pass so the first real request is not slow."""
+        self.predict_proba(["warmup"])
+
+    def _forward(self, texts, padding):
+        if self.backend == "student":
+            start = time.perf_counter()
+            logits = self.student.logits(texts)
+            if self.timing_hook is not None:
+                self.timing_hook("forward", time.perf_counter() - start)
+            return sigmoid(logits)
+        if self.backend != "torch":
+            return self._forward_onnx(texts, padding)
+        import torch
+
+        start = time.perf_counter()
+        enc = self.tokenizer(
+            texts,
+            padding=padding,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt"
+        ).to(self.device)
+        self.tokens_processed += enc["input_ids"].numel()
+        tokenized = time.perf_counter()
+
+        with torch.no_grad():
+            logits = self.model(**enc).logits
+            probs = torch.sigmoid(logits).cpu().numpy()
+        self._report_timing(start, tokenized)
+        return probs
+
+    def _forward_onnx(self, texts, padding):
+        start = time.perf_counter()
+        enc = self.tokenizer(
+            texts,
+            padding=padding,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        self.tokens_processed += enc["input_ids"].size
+        tokenized = time.perf_counter()
+        feed = {name: arr.astype(np.int64) for name, arr in enc.items() if name in self._onnx_inputs}
+        logits = self.session.run(["logits"], feed)[0]
+        self._report_timing(start, tokenized)
+        return sigmoid(logits)
+
+    def _report_timing(self, start, tokenized):
+        if self.timing_hook is not None:
+            self.timing_hook("tokenize", tokenized - start)
+            self.timing_hook("forward", time.perf_counter() - tokenized)
+
+    def predict_proba(self, texts, batch_size: int = 32, padding="longest", bucket: bool = True):
+        """Return a (len(texts), n_diseases) array of sigmoid probabilities.
+
+        Inputs are padded per batch (``padding="longest"``) and, when ``bucket``
+        is set, grouped by character length so similar-length texts share a
+        batch. Rows come back in input order either way.
+        """
+        texts = list(texts)
+        probs = np.zeros((len(texts), len(self.diseases)), dtype=np.float32)
+        if bucket and len(texts) > batch_size:
+            batches = length_bucketed_batches([len(t) for t in texts], batch_size)
+        else:
+            batches = (np.arange(i, min(i + batch_size, len(texts))) for i in range(0, len(texts), batch_size))
+
+        for ix in batches:
+            probs[ix] = self._forward([texts[i] for i in ix], padding)
+        return probs
+
+    def top_k(self, texts, k: int = 3):
+        """Return, for each text, a list of (disease, probability) pairs."""
+        probs = self.predict_proba(texts)
+        return [
+            [(self.diseases[idx], float(row[idx])) for idx in top_ix]
+            for row, top_ix in zip(probs, top_k_indices(probs, k))
+        ]
+
+    @property
+    def embedding_dim(self):
+        """Length of the vectors embed() returns; None for backends that cannot embed."""
+        if self.backend == "student":
+            return len(self.diseases)
+        if self.backend == "torch":
+            return self.model.config.hidden_size
+        return None
+
+    def embed(self, texts, batch_size: int = 32):
+        """One pooled vector per text: mean of the last hidden layer (torch) or the student's logit vector."""
+        texts = list(texts)
+        if self.backend == "student":
+            return self.student.logits(texts) - self.student.intercept
+        if self.backend != "torch":
+            raise ValueError("Embeddings need the torch or student backend; the ONNX graphs only output logits")
+        import torch
+
+        vectors = np.zeros((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        batches = length_bucketed_batches([len(t) for t in texts], batch_size) if texts else []
+        for ix in batches:
+            enc = self.tokenizer(
+                [texts[i] for i in ix],
+                padding="longest",
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="pt"
+            ).to(self.device)
+            with torch.no_grad():
+                hidden = self.model(**enc, output_hidden_states=True).hidden_states[-1]
+                mask = enc["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            vectors[ix] = pooled.float().cpu().numpy()
+        return vectors
+
+
+def top_k_indices(probs, k):
+    """Column indices of the k largest probabilities per row, best first."""
+    return np.argsort(probs, axis=1)[:, -k:][:, ::-1]
+
+
+# Predict CLI: loads saved model and prints top‑k diseases
+def predict(model_dir: str, prompt: str, k: int = 3, backend: str = "torch"):
+    print(f"[PREDICT] Loading {backend} model from {model_dir}")
+    predictor = DiseasePredictor(model_dir, backend=backend)
+    print(f"[PREDICT] Using device: {predictor.device} (loaded in {predictor.load_time:.2f}s)")
+
+    for disease, prob in predictor.top_k([prompt], k)[0]:
+        print(f"{disease} ({prob * 100:.1f}%)")
+
+
+# Batch predict: stream a CSV/JSONL file through the model chunk by chunk
+def iter_input_chunks(path: str, columns, chunk_size: int):
+    """Yield DataFrames of at most chunk_size rows without loading the whole file."""
+    import pandas as pd
+
+    if path.endswith((".jsonl", ".json")):
+        for chunk in pd.read_json(path, lines=True, chunksize=chunk_size):
+            yield chunk[columns]
     else:
-        device = torch.device("cpu")
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
 
-    print(f"[PREDICT] Using device: {device}")
-    model.to(device).eval()
 
-    enc = tokenizer(
-        prompt,
-        padding="max_length",
-        truncation=True,
-        max_length=128,
-        return_tensors="pt"
-    ).to(device)
+def predict_batch(model_dir: str, input_path: str, output_path: str, text_column: str = "text",
+                  id_column: str = None, k: int = 3, batch_size: int = 32, chunk_size: int = 4096,
+                  num_threads: int = None, backend: str = "torch"):
+    predictor = DiseasePredictor(model_dir, backend=backend, num_threads=num_threads)
+    print(f"[PREDICT-BATCH] Loaded {backend} model from {model_dir} in {predictor.load_time:.2f}s")
 
-    with torch.no_grad():
-        logits = model(**enc).logits
-        probs = torch.sigmoid(logits)[0].cpu().numpy()
+    columns = [text_column] + ([id_column] if id_column else [])
+    as_jsonl = output_path.endswith((".jsonl", ".json"))
+    total = 0
+    start = time.perf_counter()
+    with open(output_path, "w", newline="") as out:
+        writer = None if as_jsonl else csv.writer(out)
+        if writer:
+            writer.writerow(
+                ["id"] + [f"label_{i}" for i in range(1, k + 1)] + [f"prob_{i}" for i in range(1, k + 1)]
+            )
 
-    top_ix = np.argsort(probs)[-k:][::-1]
-    for idx in top_ix:
-        print(f"{diseases[idx]} ({probs[idx] * 100:.1f}%)")
+        for chunk in iter_input_chunks(input_path, columns, chunk_size):
+            texts = chunk[text_column].fillna("").astype(str).tolist()
+            ids = chunk[id_column].tolist() if id_column else range(total, total + len(texts))
+            probs = predictor.predict_proba(texts, batch_size=batch_size)
+
+            for row_id, row, top_ix in zip(ids, probs, top_k_indices(probs, k)):
+                labels = [predictor.diseases[ix] for ix in top_ix]
+                scores = [round(float(row[ix]), 6) for ix in top_ix]
+                if as_jsonl:
+                    out.write(json.dumps({"id": row_id, "labels": labels, "probabilities": scores}) + "\n")
+                else:
+                    writer.writerow([row_id] + labels + scores)
+            out.flush()
+
+            total += len(texts)
+            elapsed = time.perf_counter() - start
+            print(f"[PREDICT-BATCH] {total} rows  {total / elapsed:.1f} rows/s")
+
+    print(f"[PREDICT-BATCH] Wrote {total} predictions to {output_path}")
+
+
+# Padding benchmark: fixed max_length padding vs dynamic padding + length buckets
+def bench_padding(csv_path: str, model_dir: str, batch_size: int = 32):
+    import pandas as pd
+
+    texts = pd.read_csv(csv_path)["text"].astype(str).tolist()
+    predictor = DiseasePredictor(model_dir)
+    predictor.warmup()
+    print(f"[BENCH] {len(texts)} texts, batch size {batch_size}, device {predictor.device}")
+
+    results = {}
+    for name, padding, bucket in [("max_length", "max_length", False), ("dynamic", "longest", True)]:
+        predictor.tokens_processed = 0
+        start = time.perf_counter()
+        probs = predictor.predict_proba(texts, batch_size=batch_size, padding=padding, bucket=bucket)
+        elapsed = time.perf_counter() - start
+        results[name] = (probs, predictor.tokens_processed, elapsed)
+        print(f"[BENCH] {name:>10}: {predictor.tokens_processed:>9} tokens  {elapsed:7.2f}s  "
+              f"{len(texts) / elapsed:8.1f} texts/s")
+
+    (base_probs, base_tokens, base_time), (dyn_probs, dyn_tokens, dyn_time) = results["max_length"], results["dynamic"]
+    print(f"[BENCH] tokens -{(1 - dyn_tokens / base_tokens) * 100:.1f}%, speedup {base_time / dyn_time:.2f}x, "
+          f"max |Δprob| {np.abs(base_probs - dyn_probs).max():.2e}")
+
+
+# Export: ONNX graph + dynamically quantized int8 variant for CPU-only nodes
+def export(model_dir: str, opset: int = 14):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    model.config.return_dict = False
+
+    sample = tokenizer(["fever and headache"], return_tensors="pt")
+    # torch.onnx traces positionally, so order the inputs as forward() declares them
+    # (BERT takes attention_mask before token_type_ids; the tokenizer emits the reverse)
+    parameters = inspect.signature(model.forward).parameters
+    input_names = [name for name in parameters if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    onnx_path = os.path.join(model_dir, ONNX_FILES["onnx"])
+    print(f"[EXPORT] Writing ONNX graph to {onnx_path}")
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in input_names),
+        onnx_path,
+        input_names=input_names,
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=opset
+    )
+
+    int8_path = os.path.join(model_dir, ONNX_FILES["int8"])
+    print(f"[EXPORT] Writing dynamically quantized int8 graph to {int8_path}")
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    print("[EXPORT] Done!")
+
+
+# Parity check: macro‑F1 and top‑k agreement of exported backends vs fp32 torch
+def parity(csv_path: str, model_dir: str, k: int = 3, backends=("onnx", "int8")):
+    import torch
+    from sklearn.metrics import f1_score
+
+    _, eval_ds, _ = load_and_prepare(csv_path)
+    texts = eval_ds["text"]
+    y_true = np.array(eval_ds["label_vec"]).astype(np.int32)
+
+    reference = DiseasePredictor(model_dir, device=torch.device("cpu"))
+    rows = []
+    ref_top = None
+    for backend in ("torch",) + tuple(backends):
+        predictor = reference if backend == "torch" else DiseasePredictor(model_dir, backend=backend)
+        start = time.perf_counter()
+        probs = predictor.predict_proba(texts)
+        elapsed = time.perf_counter() - start
+
+        top = top_k_indices(probs, k)
+        if ref_top is None:
+            ref_top = top
+        f1 = f1_score(y_true, (probs >= 0.5).astype(np.int32), average="macro", zero_division=0)
+        top1 = float(np.mean(top[:, 0] == ref_top[:, 0]))
+        topk = float(np.mean([set(a) == set(b) for a, b in zip(top, ref_top)]))
+        rows.append((backend, f1, top1, topk, elapsed))
+
+    print(f"[PARITY] {len(texts)} eval texts, k={k}")
+    topk_header = f"top{k}_agree"
+    print(f"[PARITY] {'backend':>8} {'f1_macro':>9} {'top1_agree':>11} {topk_header:>11} {'seconds':>8}")
+    for backend, f1, top1, topk, elapsed in rows:
+        print(f"[PARITY] {backend:>8} {f1:9.4f} {top1:11.4f} {topk:11.4f} {elapsed:8.2f}")
+
+
+# Similar-case retrieval: memory-mapped, L2-normalized case embeddings + top-k cosine search
+CASE_INDEX_FILES = {
+    "embeddings": "embeddings.f32",  # rows x dim float32, row-major
+    "labels": "labels.i32",  # index into diseases, -1 if unknown
+    "cases": "cases.jsonl",  # {"id", "text", "key"} per row
+    "projection": "projection.npz",
+    "meta": "meta.json"
+}
+
+
+def case_key(text, label):
+    return hashlib.sha1(f"{label}\x00{text}".encode()).hexdigest()[:16]
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class CaseIndex:
+    """Nearest past cases by cosine similarity over memory-mapped embeddings.
+
+    Vectors are stored L2-normalized (after an optional PCA projection fitted
+    when the index is created), so a search is one matrix product per block
+    of rows followed by argpartition. ``add`` appends rows to the files in
+    place and only rewrites meta.json, so growing the corpus costs only the
+    new rows' embeddings.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(self._path("meta")) as f:
+            self.meta = json.load(f)
+        self.diseases = self.meta["diseases"]
+        self.dim = self.meta["dim"]
+        projection = self._path("projection")
+        if os.path.exists(projection):
+            with np.load(projection) as data:
+                self.mean, self.components = data["mean"], data["components"]
+        else:
+            self.mean = self.components = None
+        with open(self._path("cases")) as f:
+            self.cases = [json.loads(line) for _, line in zip(range(self.meta["rows"]), f)]
+        self.keys = {case["key"] for case in self.cases}
+        self._map()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, CASE_INDEX_FILES[name])
+
+    def _map(self):
+        rows = self.meta["rows"]
+        if rows:
+            self.embeddings = np.memmap(self._path("embeddings"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+            self.labels = np.memmap(self._path("labels"), dtype=np.int32, mode="r", shape=(rows,))
+        else:
+            self.embeddings = np.zeros((0, self.dim), dtype=np.float32)
+            self.labels = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def input_dim(self):
+        """Length of the embeddings queries must have, before the projection."""
+        return self.components.shape[0] if self.components is not None else self.dim
+
+    def check_compatible(self, predictor):
+        """Raise ValueError unless ``predictor``'s embeddings can be searched in this index."""
+        model = {"model_dir": os.path.abspath(predictor.model_dir), "backend": predictor.backend}
+        if self.meta.get("model") != model:
+            raise ValueError(f"index was built with {self.meta.get('model')}, not {model}")
+        if predictor.embedding_dim != self.input_dim:
+            raise ValueError(f"index expects {self.input_dim}-d embeddings, the {predictor.backend} "
+                             f"backend produces {predictor.embedding_dim}")
+
+    @classmethod
+    def create(cls, index_dir: str, diseases, sample, dim: int = 128, model: dict = None) -> "CaseIndex":
+        """Empty index; when ``sample`` has enough rows, fit a PCA projection to ``dim`` dimensions on it."""
+        os.makedirs(index_dir, exist_ok=True)
+        for name in ("embeddings", "labels", "cases", "projection"):
+            path = os.path.join(index_dir, CASE_INDEX_FILES[name])
+            if os.path.exists(path):
+                os.remove(path)
+            if name != "projection":
+                open(path, "wb").close()
+
+        out_dim = sample.shape[1]
+        # A projection fitted on a handful of rows would not generalize to later additions
+        if dim and dim < sample.shape[1] and len(sample) >= 4 * dim:
+            mean = sample.mean(axis=0)
+            _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+            np.savez(os.path.join(index_dir, CASE_INDEX_FILES["projection"]),
+                     mean=mean.astype(np.float32), components=vt[:dim].T.astype(np.float32))
+            out_dim = dim
+        with open(os.path.join(index_dir, CASE_INDEX_FILES["meta"]), "w") as f:
+            json.dump({"rows": 0, "dim": out_dim, "diseases": list(diseases), "model": model or {}}, f, indent=2)
+        return cls(index_dir)
+
+    def project(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.components is not None:
+            vectors = (vectors - self.mean) @ self.components
+        return _normalize_rows(vectors).astype(np.float32)
+
+    def add(self, vectors, labels, texts, ids=None):
+        """Append rows; labels are disease names (unknown names are stored as -1)."""
+        rows = self.meta["rows"]
+        vectors = self.project(vectors)
+        label_ix = {name: i for i, name in enumerate(self.diseases)}
+        codes = np.array([label_ix.get(label, -1) for label in labels], dtype=np.int32)
+        ids = list(ids) if ids is not None else list(range(rows, rows + len(texts)))
+        cases = [{"id": case_id, "text": text, "key": case_key(text, label)}
+                 for case_id, text, label in zip(ids, texts, labels)]
+
+        # Drop anything past the rows meta.json vouches for (left by an interrupted add), then append
+        for name, data, row_bytes in (("embeddings", vectors, 4 * self.dim), ("labels", codes, 4)):
+            with open(self._path(name), "r+b") as f:
+                f.truncate(rows * row_bytes)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(data).tobytes())
+        with open(self._path("cases"), "r+b") as f:
+            for _ in range(rows):
+                f.readline()
+            f.truncate(f.tell())
+            f.writelines((json.dumps(case) + "\n").encode() for case in cases)
+
+        self.meta["rows"] = rows + len(cases)
+        tmp = self._path("meta") + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, self._path("meta"))
+        self.cases.extend(cases)
+        self.keys.update(case["key"] for case in cases)
+        self._map()
+
+    def search(self, queries, k: int = 5, disease: str = None, block_rows: int = 1 << 17):
+        """(scores, row indices) of the k most similar cases per query row, best first.
+
+        Rows are scanned in blocks, so memory stays at queries x block_rows
+        scores however large the index is.
+        """
+        q = self.project(np.atleast_2d(queries))
+        rows = len(self)
+        k = min(k, rows)
+        best_scores = np.full((len(q), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(q), 0), dtype=np.int64)
+        if k == 0:
+            return best_scores, best_rows
+        wanted = self.diseases.index(disease) if disease is not None else None
+
+        for start in range(0, rows, block_rows):
+            scores = q @ self.embeddings[start:start + block_rows].T
+            if wanted is not None:
+                scores[:, self.labels[start:start + block_rows] != wanted] = -np.inf
+            kk = min(k, scores.shape[1])
+            part = np.argpartition(scores, -kk, axis=1)[:, -kk:]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, part + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+    def similar(self, queries, k: int = 5, disease: str = None):
+        """Per query, a list of {"id", "text", "disease", "score"} dicts, best first."""
+        scores, rows = self.search(queries, k, disease)
+        results = []
+        for row_scores, row_ix in zip(scores, rows):
+            matches = []
+            for score, ix in zip(row_scores, row_ix):
+                if not np.isfinite(score):
+                    continue
+                label = int(self.labels[ix])
+                case = self.cases[ix]
+                matches.append({
+                    "id": case["id"],
+                    "text": case["text"],
+                    "disease": self.diseases[label] if label >= 0 else None,
+                    "score": round(float(score), 4)
+                })
+            results.append(matches)
+        return results
+
+
+def update_case_index(csv_path: str, model_dir: str, index_dir: str = None, backend: str = "torch",
+                      dim: int = 128, batch_size: int = 32, chunk_size: int = 4096, rebuild: bool = False):
+    """Embed the CSV's rows that are not in the index yet and append them.
+
+    The index is rebuilt from scratch when ``rebuild`` is set or when it was
+    built with a different model directory or backend.
+    """
+    import pandas as pd
+
+    index_dir = index_dir or os.path.join(model_dir, "case_index")
+    df = pd.read_csv(csv_path).drop(columns=["Unnamed: 0"], errors="ignore")
+    texts = df["text"].fillna("").astype(str).tolist()
+    labels = df["label"].astype(str).tolist() if "label" in df.columns else [""] * len(texts)
+    ids = df["id"].tolist() if "id" in df.columns else list(range(len(texts)))
+
+    predictor = DiseasePredictor(model_dir, backend=backend)
+    model = {"model_dir": os.path.abspath(model_dir), "backend": backend}
+    index = None
+    if not rebuild and os.path.exists(os.path.join(index_dir, CASE_INDEX_FILES["meta"])):
+        index = CaseIndex(index_dir)
+        if index.meta.get("model") != model:
+            print(f"[INDEX] {index_dir} was built with {index.meta.get('model')}; rebuilding")
+            index = None
+
+    seen = set(index.keys) if index is not None else set()
+    new = []
+    for i, (text, label) in enumerate(zip(texts, labels)):
+        key = case_key(text, label)
+        if key not in seen:
+            seen.add(key)
+            new.append(i)
+    print(f"[INDEX] {len(texts)} rows in {csv_path}, {len(new)} new")
+
+    start = time.perf_counter()
+    for begin in range(0, len(new), chunk_size):
+        chunk = new[begin:begin + chunk_size]
+        vectors = predictor.embed([texts[i] for i in chunk], batch_size=batch_size)
+        if index is None:
+            index = CaseIndex.create(index_dir, predictor.diseases, vectors, dim, model)
+        index.add(vectors, [labels[i] for i in chunk], [texts[i] for i in chunk], [ids[i] for i in chunk])
+        done = begin + len(chunk)
+        print(f"[INDEX] {done}/{len(new)} embedded  {done / (time.perf_counter() - start):.1f} rows/s")
+    if index is not None:
+        print(f"[INDEX] {len(index)} cases x {index.dim} dims in {index_dir}")
+    return index
+
+
+def similar_cases(model_dir: str, prompt: str, k: int = 5, index_dir: str = None, backend: str = "torch"):
+    index = CaseIndex(index_dir or os.path.join(model_dir, "case_index"))
+    predictor = DiseasePredictor(model_dir, backend=backend)
+    index.check_compatible(predictor)
+    start = time.perf_counter()
+    matches = index.similar(predictor.embed([prompt]), k)[0]
+    print(f"[SIMILAR] {len(index)} cases searched in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for match in matches:
+        print(f"{match['score']:.3f}  {match['disease']}  {match['text']}")
+
+
+# Distillation: TF-IDF/linear student fitted to the teacher's soft labels
+def _single_text_latency(predictor, texts, n=50):
+    """Mean seconds for one-text predictions, as on the per-message voice path."""
+    sample = texts[:n]
+    start = time.perf_counter()
+    for text in sample:
+        predictor.predict_proba([text])
+    return (time.perf_counter() - start) / max(len(sample), 1)
+
+
+def distill(csv_path: str, teacher_dir: str, output_dir: str, alpha: float = 0.7, seed: int = 42,
+            max_features: int = 50000, ridge_alpha: float = 1.0, teacher_backend: str = "torch"):
+    """Fit a StudentModel on a mix of teacher probabilities (weight ``alpha``) and the hard labels.
+
+    The student regresses the teacher's logits, so its sigmoid outputs stay
+    on the teacher's probability scale and the server's confidence
+    threshold keeps its meaning. Writes student.npz/student.json and
+    diseases.txt to output_dir (serve with backend="student") and prints
+    the macro-F1/accuracy gap and speedup against the teacher on the eval split.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import Ridge
+    from sklearn.metrics import f1_score
+
+    train_ds, eval_ds, diseases = load_and_prepare(csv_path, seed)
+    train_texts, eval_texts = list(train_ds["text"]), list(eval_ds["text"])
+    hard = np.array(train_ds["label_vec"], dtype=np.float32)
+    y_true = np.array(eval_ds["label_vec"]).astype(np.int32)
+
+    print(f"[DISTILL] Scoring {len(train_texts)} training texts with the {teacher_backend} teacher")
+    teacher = DiseasePredictor(teacher_dir, backend=teacher_backend)
+    soft = teacher.predict_proba(train_texts)
+    targets = np.clip(alpha * soft + (1 - alpha) * hard, 1e-4, 1 - 1e-4)
+
+    print("[DISTILL] Fitting TF-IDF + ridge student")
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, max_features=max_features)
+    features = vectorizer.fit_transform(train_texts)
+    ridge = Ridge(alpha=ridge_alpha).fit(features, np.log(targets / (1 - targets)))
+    student = StudentModel(vectorizer.get_feature_names_out(), vectorizer.idf_, ridge.coef_.T, ridge.intercept_,
+                           vectorizer.ngram_range)
+
+    os.makedirs(output_dir, exist_ok=True)
+    student.save(output_dir, teacher=os.path.abspath(teacher_dir), alpha=alpha, ridge_alpha=ridge_alpha)
+    with open(os.path.join(output_dir, "diseases.txt"), "w") as f:
+        f.write("\n".join(diseases))
+    print(f"[DISTILL] Saved {len(student.vocabulary)}-feature student to {output_dir}")
+
+    rows = []
+    reference = None
+    for name, predictor in (("teacher", teacher), ("student", DiseasePredictor(output_dir, backend="student"))):
+        predictor.warmup()
+        start = time.perf_counter()
+        probs = predictor.predict_proba(eval_texts)
+        batch_seconds = time.perf_counter() - start
+        single = _single_text_latency(predictor, eval_texts)
+        top1 = probs.argmax(axis=1)
+        if reference is None:
+            reference = top1
+        rows.append((
+            name,
+            f1_score(y_true, (probs >= 0.5).astype(np.int32), average="macro", zero_division=0),
+            float(np.mean(top1 == y_true.argmax(axis=1))),
+            float(np.mean(top1 == reference)),
+            batch_seconds,
+            single
+        ))
+
+    print(f"[DISTILL] {len(eval_texts)} eval texts")
+    print(f"[DISTILL] {'model':>8} {'f1_macro':>9} {'accuracy':>9} {'top1_agree':>11} {'batch_s':>8} {'ms/text':>8}")
+    for name, f1, accuracy, agree, batch_seconds, single in rows:
+        print(f"[DISTILL] {name:>8} {f1:9.4f} {accuracy:9.4f} {agree:11.4f} {batch_seconds:8.2f} {single * 1000:8.2f}")
+    (_, t_f1, t_acc, _, t_batch, t_single), (_, s_f1, s_acc, _, s_batch, s_single) = rows
+    print(f"[DISTILL] Gap: f1_macro {s_f1 - t_f1:+.4f}, accuracy {s_acc - t_acc:+.4f}; "
+          f"speedup {t_batch / s_batch:.1f}x batched, {t_single / s_single:.1f}x per message")
+
+
+# Daemon: keep one warm predictor behind a Unix socket so repeated CLI predictions skip model startup
+def serve(model_dir: str, socket_path: str = DAEMON_SOCKET, backend: str = "torch", num_threads: int = None):
+    import socketserver
+    import threading
+
+    predictor = DiseasePredictor(model_dir, backend=backend, num_threads=num_threads)
+    predictor.warmup()
+    model_path = os.path.abspath(model_dir)
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            # One JSON request per line: {"prompt": ..., "k": 3, "model_dir": ..., "backend": ...}
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                    if (os.path.abspath(request.get("model_dir", model_dir)) != model_path
+                            or request.get("backend", backend) != backend):
+                        reply = {"error": f"daemon serves {backend} {model_path}", "wrong_model": True}
+                    else:
+                        with lock:
+                            top = predictor.top_k([request["prompt"]], int(request.get("k", 3)))[0]
+                        reply = {"predictions": top}
+                except Exception as e:
+                    reply = {"error": str(e)}
+                self.wfile.write((json.dumps(reply) + "\n").encode())
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+        print(f"[SERVE] {backend} model from {model_dir} (loaded in {predictor.load_time:.2f}s) on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+def predict_via_daemon(model_dir: str, prompt: str, k: int = 3, socket_path: str = DAEMON_SOCKET,
+                       timeout: float = 30.0, backend: str = "torch"):
+    """Top-k (disease, probability) pairs from a running `serve` daemon, or None if none serves model_dir/backend."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            request = {"prompt": prompt, "k": k, "model_dir": os.path.abspath(model_dir), "backend": backend}
+            sock.sendall((json.dumps(request) + "\n").encode())
+            with sock.makefile("rb") as f:
+                reply = json.loads(f.readline() or b"{}")
+    except (FileNotFoundError, ConnectionRefusedError, AttributeError):
+        # AttributeError: no AF_UNIX on this platform
+        return None
+    if reply.get("wrong_model"):
+        return None
+    if "error" in reply:
+        raise RuntimeError(f"Daemon error: {reply['error']}")
+    return [tuple(pair) for pair in reply["predictions"]]
+
+
+# Import-time budget: importing this module must not pull in the heavy ML stack
+def check_import(budget: float = IMPORT_BUDGET_SECONDS):
+    """Time `import Model` in a fresh interpreter; False if over budget or a heavy module is imported eagerly."""
+    import subprocess
+
+    code = (
+        "import sys, time; start = time.perf_counter(); import Model; "
+        "print(time.perf_counter() - start); "
+        "print(','.join(m for m in Model.HEAVY_MODULES if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    seconds, leaked = result.stdout.splitlines()
+    seconds = float(seconds)
+    leaked = [name for name in leaked.split(",") if name]
+
+    print(f"[IMPORT] import Model: {seconds * 1000:.0f} ms (budget {budget * 1000:.0f} ms)")
+    if leaked:
+        print(f"[IMPORT] Imported at module level: {', '.join(leaked)}")
+    return seconds <= budget and not leaked
 
 
 # 6) CLI entrypoint
@@ -197,14 +1179,119 @@ if __name__ == "__main__":
     t = sub.add_parser("train", help="Train the PubMedBERT classifier")
     t.add_argument("--data", required=True, help="Path to Symptom2Disease.csv")
     t.add_argument("--out", default="saved_model", help="Where to save model")
+    t.add_argument("--max-length", type=int, default=128, help="Truncate texts to this many tokens")
+    t.add_argument("--seed", type=int, default=42, help="Train/eval split seed")
+    t.add_argument("--cache-dir", default=".cache/preprocessed", help="Where tokenized splits are cached")
+    t.add_argument("--no-cache", action="store_true", help="Always re-tokenize, never read/write the cache")
+    t.add_argument("--profile", choices=sorted(TRAIN_PROFILES), default="default",
+                   help="Option defaults; 'cpu' tunes threads, workers, bf16 and early stopping for CPU hosts")
+    t.add_argument("--batch-size", type=int, help="Per-device batch size")
+    t.add_argument("--epochs", type=float, help="Maximum number of epochs")
+    t.add_argument("--grad-accum", type=int, help="Gradient accumulation steps")
+    t.add_argument("--threads", type=int, help="torch intra-op threads")
+    t.add_argument("--interop-threads", type=int, help="torch inter-op threads")
+    t.add_argument("--dataloader-workers", type=int, help="Parallel dataloader worker processes")
+    t.add_argument("--bf16", choices=("on", "off", "auto"), help="bf16 autocast")
+    t.add_argument("--early-stopping", type=int, help="Stop after this many epochs without f1_macro improvement")
 
     p = sub.add_parser("predict", help="Predict diseases for a prompt")
     p.add_argument("--model-dir", default="saved_model", help="Where your model lives")
     p.add_argument("--prompt", required=True, help="User symptom description")
     p.add_argument("--k", type=int, default=3, help="How many top diseases to show")
+    p.add_argument("--backend", choices=BACKENDS, default="torch", help="Inference runtime")
+    p.add_argument("--daemon", action="store_true",
+                   help="Ask a running `serve` daemon first; load the model locally if none is listening")
+    p.add_argument("--socket", default=DAEMON_SOCKET, help="Daemon socket path")
+
+    pb = sub.add_parser("predict-batch", help="Score a CSV/JSONL file of symptom texts in chunks")
+    pb.add_argument("--model-dir", default="saved_model", help="Where your model lives")
+    pb.add_argument("--input", required=True, help="CSV or JSONL file with one symptom text per row")
+    pb.add_argument("--output", required=True, help="Output .csv or .jsonl, written incrementally")
+    pb.add_argument("--text-column", default="text", help="Column/field holding the symptom text")
+    pb.add_argument("--id-column", help="Column/field copied to the output (default: row number)")
+    pb.add_argument("--k", type=int, default=3, help="How many top diseases to write")
+    pb.add_argument("--batch-size", type=int, default=32, help="Rows per forward pass")
+    pb.add_argument("--chunk-size", type=int, default=4096, help="Rows read from disk at a time")
+    pb.add_argument("--threads", type=int, help="Intra-op threads for torch/ONNX Runtime")
+    pb.add_argument("--backend", choices=BACKENDS, default="torch", help="Inference runtime")
+
+    e = sub.add_parser("export", help="Export ONNX + int8 graphs next to the saved model")
+    e.add_argument("--model-dir", default="saved_model", help="Where your model lives")
+    e.add_argument("--opset", type=int, default=14, help="ONNX opset version")
+    e.add_argument("--data", help="Symptom2Disease.csv; if given, run the parity check after export")
+    e.add_argument("--k", type=int, default=3, help="k for top-k agreement in the parity check")
+
+    b = sub.add_parser("bench-padding", help="Compare fixed vs dynamic padding on a CSV")
+    b.add_argument("--data", required=True, help="Path to Symptom2Disease.csv")
+    b.add_argument("--model-dir", default="saved_model", help="Where your model lives")
+    b.add_argument("--batch-size", type=int, default=32, help="Inference batch size")
+
+    ds = sub.add_parser("distill", help="Train a TF-IDF/linear student on the teacher's soft labels")
+    ds.add_argument("--data", required=True, help="Path to Symptom2Disease.csv")
+    ds.add_argument("--teacher-dir", default="saved_model", help="Fine-tuned teacher model")
+    ds.add_argument("--out", default="saved_model_student", help="Where to save the student")
+    ds.add_argument("--alpha", type=float, default=0.7, help="Weight of teacher probabilities vs hard labels")
+    ds.add_argument("--max-features", type=int, default=50000, help="TF-IDF vocabulary size")
+    ds.add_argument("--seed", type=int, default=42, help="Train/eval split seed (match the teacher's)")
+    ds.add_argument("--teacher-backend", choices=BACKENDS[:3], default="torch", help="Runtime for the teacher")
+
+    ix = sub.add_parser("index", help="Build or extend the similar-case index from a CSV")
+    ix.add_argument("--data", required=True, help="CSV with text (and label, optional id) columns")
+    ix.add_argument("--model-dir", default="saved_model", help="Where your model lives")
+    ix.add_argument("--index-dir", help="Index location (default: <model-dir>/case_index)")
+    ix.add_argument("--backend", choices=("torch", "student"), default="torch", help="Embedding model")
+    ix.add_argument("--dim", type=int, default=128, help="PCA dimensions stored per case (0 keeps all)")
+    ix.add_argument("--batch-size", type=int, default=32, help="Rows per forward pass")
+    ix.add_argument("--rebuild", action="store_true", help="Discard the existing index first")
+
+    sm = sub.add_parser("similar", help="Show the most similar indexed cases for a prompt")
+    sm.add_argument("--model-dir", default="saved_model", help="Where your model lives")
+    sm.add_argument("--index-dir", help="Index location (default: <model-dir>/case_index)")
+    sm.add_argument("--prompt", required=True, help="User symptom description")
+    sm.add_argument("--k", type=int, default=5, help="How many cases to show")
+    sm.add_argument("--backend", choices=("torch", "student"), default="torch", help="Embedding model")
+
+    d = sub.add_parser("serve", help="Keep a warm predictor behind a Unix socket for `predict --daemon`")
+    d.add_argument("--model-dir", default="saved_model", help="Where your model lives")
+    d.add_argument("--socket", default=DAEMON_SOCKET, help="Socket path to listen on")
+    d.add_argument("--backend", choices=BACKENDS, default="torch", help="Inference runtime")
+    d.add_argument("--threads", type=int, help="Intra-op threads for torch/ONNX Runtime")
+
+    c = sub.add_parser("check-import", help="Fail if importing this module exceeds the import-time budget")
+    c.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="Budget in seconds")
 
     args = parser.parse_args()
     if args.cmd == "train":
-        train(args.data, args.out)
+        train(args.data, args.out, args.max_length, args.seed, None if args.no_cache else args.cache_dir,
+              args.profile, batch_size=args.batch_size, epochs=args.epochs, grad_accum=args.grad_accum,
+              threads=args.threads, interop_threads=args.interop_threads,
+              dataloader_workers=args.dataloader_workers, bf16=args.bf16, early_stopping=args.early_stopping)
     elif args.cmd == "predict":
-        predict(args.model_dir, args.prompt, args.k)
\ No newline at end of file
+        top = predict_via_daemon(args.model_dir, args.prompt, args.k, args.socket,
+                                 backend=args.backend) if args.daemon else None
+        if top is None:
+            predict(args.model_dir, args.prompt, args.k, args.backend)
+        else:
+            for disease, prob in top:
+                print(f"{disease} ({prob * 100:.1f}%)")
+    elif args.cmd == "predict-batch":
+        predict_batch(args.model_dir, args.input, args.output, args.text_column, args.id_column,
+                      args.k, args.batch_size, args.chunk_size, args.threads, args.backend)
+    elif args.cmd == "export":
+        export(args.model_dir, args.opset)
+        if args.data:
+            parity(args.data, args.model_dir, args.k)
+    elif args.cmd == "bench-padding":
+        bench_padding(args.data, args.model_dir, args.batch_size)
+    elif args.cmd == "distill":
+        distill(args.data, args.teacher_dir, args.out, args.alpha, args.seed, args.max_features,
+                teacher_backend=args.teacher_backend)
+    elif args.cmd == "index":
+        update_case_index(args.data, args.model_dir, args.index_dir, args.backend, args.dim, args.batch_size,
+                          rebuild=args.rebuild)
+    elif args.cmd == "similar":
+        similar_cases(args.model_dir, args.prompt, args.k, args.index_dir, args.backend)
+    elif args.cmd == "serve":
+        serve(args.model_dir, args.socket, args.backend, args.threads)
+    elif args.cmd == "check-import":
+        sys.exit(0 if check_import(args.budget) else 1)
@@ -31,10 +31,103 @@ class UrgencyLevel(enum.Enum):
     HIGH = "high"
 
 
+# Diagnosis rules: add a condition by adding a row here.
+#   all_of:          every one of these symptoms must be recorded
+#   any_of:          at least one of these must be recorded (ignored when empty)
+#   severity:        only matches if some symptom was recorded at this severity
+#   urgency:         urgency when the rule matches
+#   severe_urgency:  urgency instead, if any symptom was recorded as severe
+DIAGNOSIS_RULES = [
+    {
+        "diagnosis": "Possible cardiac or respiratory emergency - seek immediate medical attention",
+        "any_of": [Symptom.CHEST_PAIN, Symptom.SHORTNESS_OF_BREATH],
+        "severity": Severity.SEVERE,
+        "urgency": UrgencyLevel.HIGH,
+    },
+    {
+        "diagnosis": "Common cold or flu",
+        "all_of": [Symptom.FEVER],
+        "any_of": [Symptom.COUGH, Symptom.SORE_THROAT],
+        "urgency": UrgencyLevel.LOW,
+        "severe_urgency": UrgencyLevel.MODERATE,
+    },
+    {
+        "diagnosis": "Possible migraine",
+        "all_of": [Symptom.HEADACHE],
+        "any_of": [Symptom.NAUSEA, Symptom.DIZZINESS],
+        "urgency": UrgencyLevel.LOW,
+    },
+]
+
+_SYMPTOM_BITS = {symptom: 1 << i for i, symptom in enumerate(Symptom)}
+_SEVERITY_BITS = {severity: 1 << i for i, severity in enumerate(Severity)}
+_URGENCY_RANK = {UrgencyLevel.LOW: 0, UrgencyLevel.MODERATE: 1, UrgencyLevel.HIGH: 2}
+
+
+def _compile_rules(rules):
+    """Turn DIAGNOSIS_RULES rows into (diagnosis, all_mask, any_mask, severity_mask, urgency, severe_urgency)."""
+    compiled = []
+    for rule in rules:
+        all_mask = 0
+        for symptom in rule.get("all_of", []):
+            all_mask |= _SYMPTOM_BITS[symptom]
+        any_mask = 0
+        for symptom in rule.get("any_of", []):
+            any_mask |= _SYMPTOM_BITS[symptom]
+        severity_mask = _SEVERITY_BITS[rule["severity"]] if "severity" in rule else 0
+        urgency = rule.get("urgency", UrgencyLevel.LOW)
+        compiled.append(
+            (rule["diagnosis"], all_mask, any_mask, severity_mask, urgency, rule.get("severe_urgency", urgency))
+        )
+    return compiled
+
+
+_COMPILED_RULES = _compile_rules(DIAGNOSIS_RULES)
+
+
+def _to_enum(enum_cls, value):
+    # Convert string inputs to enum values if needed; unknown strings are kept as-is
+    if isinstance(value, str):
+        try:
+            return enum_cls(value.lower())
+        except ValueError:
+            return value
+    return value
+
+
 class AssistantFnc:
+    # Oldest entries are dropped past this, so one long session cannot grow without bound
+    max_symptoms = 50
+
     def __init__(self) -> None:
         self._patient_symptoms = []
         self._patient_info = {}
+        # Bitmasks of recorded Symptom/Severity values, kept up to date by _append_symptom
+        self._symptom_mask = 0
+        self._severity_mask = 0
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot of the recorded symptoms and patient info"""
+        return {
+            "symptoms": [
+                {
+                    "symptom": getattr(s["symptom"], "value", s["symptom"]),
+                    "severity": getattr(s["severity"], "value", s["severity"]),
+                    "duration": s["duration"]
+                }
+                for s in self._patient_symptoms
+            ],
+            "info": dict(self._patient_info)
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "AssistantFnc":
+        """Rebuild an instance from to_state() output"""
+        fnc = cls()
+        for s in state.get("symptoms", []):
+            fnc._append_symptom(s["symptom"], s["severity"], s["duration"])
+        fnc._patient_info = dict(state.get("info", {}))
+        return fnc
 
     def record_symptom(self, symptom_name, severity_level, duration):
         """Record a patient's symptom
@@ -44,89 +137,65 @@ class AssistantFnc:
             severity_level: The severity of the symptom (mild, moderate, severe)
             duration: How long the symptom has been present (e.g., '2 days', '1 week')
         """
-        logger.info("Recording symptom: %s, severity: %s, duration: %s", symptom_name, severity_level, duration)
+        logger.debug("Recording symptom: %s, severity: %s, duration: %s", symptom_name, severity_level, duration)
+        symptom, severity = self._append_symptom(symptom_name, severity_level, duration)
         
-        # Convert string inputs to enum values if needed
-        try:
-            symptom = Symptom(symptom_name.lower()) if isinstance(symptom_name, str) else symptom_name
-            severity = Severity(severity_level.lower()) if isinstance(severity_level, str) else severity_level
-        except (ValueError, KeyError):
-            # Handle case where input doesn't match enum
-            symptom = symptom_name
-            severity = severity_level
+        severity_value = getattr(severity, "value", severity)
+        symptom_value = getattr(symptom, "value", symptom)
+        
+        return f"I've recorded that you're experiencing {severity_value} {symptom_value} for {duration}."
+
+    def _append_symptom(self, symptom_name, severity_level, duration):
+        symptom = _to_enum(Symptom, symptom_name)
+        severity = _to_enum(Severity, severity_level)
         
         self._patient_symptoms.append({
             "symptom": symptom,
             "severity": severity,
             "duration": duration
         })
-        
-        severity_value = getattr(severity, "value", severity)
-        symptom_value = getattr(symptom, "value", symptom)
-        
-        return f"I've recorded that you're experiencing {severity_value} {symptom_value} for {duration}."
+        if len(self._patient_symptoms) > self.max_symptoms:
+            del self._patient_symptoms[:-self.max_symptoms]
+            self._rebuild_masks()
+        else:
+            self._symptom_mask |= _SYMPTOM_BITS.get(symptom, 0)
+            self._severity_mask |= _SEVERITY_BITS.get(severity, 0)
+        return symptom, severity
+
+    def _rebuild_masks(self):
+        self._symptom_mask = 0
+        self._severity_mask = 0
+        for s in self._patient_symptoms:
+            self._symptom_mask |= _SYMPTOM_BITS.get(s["symptom"], 0)
+            self._severity_mask |= _SEVERITY_BITS.get(s["severity"], 0)
 
     def analyze_symptoms(self):
         """Analyze symptoms and provide possible diagnoses"""
-        logger.info("Analyzing symptoms: %s", self._patient_symptoms)
+        # Formatting the symptom list is not free; only do it when debug logging is on
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Analyzing %d symptoms: %s", len(self._patient_symptoms), self._patient_symptoms)
         
         if not self._patient_symptoms:
             return "I don't have any symptoms recorded yet. Please tell me what symptoms you're experiencing."
         
-        # Simple symptom analysis logic
+        # Each rule is a few mask tests against the incrementally maintained state
         diagnoses = []
         urgency = UrgencyLevel.LOW
+        symptoms = self._symptom_mask
+        severities = self._severity_mask
+        has_severe = bool(severities & _SEVERITY_BITS[Severity.SEVERE])
         
-        # Extract symptom and severity values
-        symptoms = []
-        severities = []
-        for s in self._patient_symptoms:
-            symptom = s["symptom"]
-            severity = s["severity"]
-            
-            # Handle both enum and string values
-            if hasattr(symptom, "value"):
-                symptoms.append(symptom)
-            else:
-                try:
-                    symptoms.append(Symptom(symptom.lower()))
-                except (ValueError, AttributeError):
-                    symptoms.append(symptom)
-                    
-            if hasattr(severity, "value"):
-                severities.append(severity)
-            else:
-                try:
-                    severities.append(Severity(severity.lower()))
-                except (ValueError, AttributeError):
-                    severities.append(severity)
-        
-        # Check for severe symptoms that require immediate attention
-        has_chest_pain = any(s == Symptom.CHEST_PAIN or (isinstance(s, str) and s.lower() == "chest_pain") for s in symptoms)
-        has_shortness_of_breath = any(s == Symptom.SHORTNESS_OF_BREATH or (isinstance(s, str) and s.lower() == "shortness_of_breath") for s in symptoms)
-        has_severe = any(s == Severity.SEVERE or (isinstance(s, str) and s.lower() == "severe") for s in severities)
-        
-        if (has_chest_pain or has_shortness_of_breath) and has_severe:
-            urgency = UrgencyLevel.HIGH
-            diagnoses.append("Possible cardiac or respiratory emergency - seek immediate medical attention")
-        
-        # Check for common cold/flu symptoms
-        has_fever = any(s == Symptom.FEVER or (isinstance(s, str) and s.lower() == "fever") for s in symptoms)
-        has_cough = any(s == Symptom.COUGH or (isinstance(s, str) and s.lower() == "cough") for s in symptoms)
-        has_sore_throat = any(s == Symptom.SORE_THROAT or (isinstance(s, str) and s.lower() == "sore_throat") for s in symptoms)
-        
-        if has_fever and (has_cough or has_sore_throat):
-            diagnoses.append("Common cold or flu")
-            if has_severe:
-                urgency = UrgencyLevel.MODERATE
-        
-        # Check for migraine
-        has_headache = any(s == Symptom.HEADACHE or (isinstance(s, str) and s.lower() == "headache") for s in symptoms)
-        has_nausea = any(s == Symptom.NAUSEA or (isinstance(s, str) and s.lower() == "nausea") for s in symptoms)
-        has_dizziness = any(s == Symptom.DIZZINESS or (isinstance(s, str) and s.lower() == "dizziness") for s in symptoms)
-        
-        if has_headache and (has_nausea or has_dizziness):
-            diagnoses.append("Possible migraine")
+        for diagnosis, all_mask, any_mask, severity_mask, rule_urgency, severe_urgency in _COMPILED_RULES:
+            if symptoms & all_mask != all_mask:
+                continue
+            if any_mask and not symptoms & any_mask:
+                continue
+            if severity_mask and not severities & severity_mask:
+                continue
+            diagnoses.append(diagnosis)
+            matched_urgency = severe_urgency if has_severe else rule_urgency
+            if _URGENCY_RANK[matched_urgency] > _URGENCY_RANK[urgency]:
+                urgency = matched_urgency
         
         # Default response if no specific patterns matched
         if not diagnoses:
@@ -148,7 +217,8 @@ class AssistantFnc:
 
     def get_recommendations(self):
         """Get treatment recommendations for symptoms"""
-        logger.info("Getting recommendations for symptoms: %s", self._patient_symptoms)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Getting recommendations for %d symptoms: %s", len(self._patient_symptoms), self._patient_symptoms)
         
         if not self._patient_symptoms:
             return "I don't have any symptoms recorded yet. Please tell me what symptoms you're experiencing."
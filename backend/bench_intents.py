@@ -0,0 +1,86 @@
+# bench_intents.py
+"""Microbenchmark: legacy nested keyword scans vs the compiled single-pass matcher.
+
+    python bench_intents.py [--iterations 20000]
+"""
+import argparse
+import time
+
+from api import Severity, Symptom
+from intents import parse_message
+
+MESSAGES = [
+    "I'm experiencing a severe headache and nausea for 3 days",
+    "I have been having a mild cough and fever since yesterday",
+    "Can you book an appointment with a specialist on friday morning?",
+    "What do I have? Please analyze my symptoms",
+    "What should I do about my sore throat?",
+    "I'm feeling dizziness and fatigue for a week",
+    "hello there, how are you today",
+    "I suffer from chest_pain and shortness_of_breath, it's severe",
+]
+
+
+def legacy_check(text):
+    """The keyword loops SimpleVoiceAssistant._check_for_functions used, minus side effects."""
+    text_lower = text.lower()
+    symptom_keywords = ["symptom", "feeling", "experiencing", "having", "suffer"]
+    if any(keyword in text_lower for keyword in symptom_keywords):
+        for symptom_name in [s.value for s in Symptom]:
+            if symptom_name in text_lower:
+                severity = Severity.MODERATE.value
+                for sev in [s.value for s in Severity]:
+                    if sev in text_lower:
+                        severity = sev
+                        break
+                duration = "recently"
+                for keyword in ["day", "week", "month", "hour", "year"]:
+                    if keyword in text_lower:
+                        for i in range(1, 10):
+                            if f"{i} {keyword}" in text_lower or f"{i}{keyword}" in text_lower:
+                                duration = f"{i} {keyword}"
+                                break
+                        if duration == "recently" and keyword in text_lower:
+                            duration = f"a {keyword}"
+                return ("symptom", symptom_name, severity, duration)
+
+    analysis_keywords = ["diagnose", "diagnosis", "what do i have", "what could it be", "analyze", "analyse", "what's wrong"]
+    if any(keyword in text_lower for keyword in analysis_keywords):
+        return ("analysis",)
+    recommendation_keywords = ["recommend", "suggestion", "advice", "what should i do", "treatment", "help"]
+    if any(keyword in text_lower for keyword in recommendation_keywords):
+        return ("recommendation",)
+    appointment_keywords = ["appointment", "schedule", "book", "visit", "see a doctor"]
+    if any(keyword in text_lower for keyword in appointment_keywords):
+        preferred_date = "tomorrow"
+        for date in ["today", "tomorrow", "monday", "tuesday", "wednesday", "thursday", "friday"]:
+            if date in text_lower:
+                preferred_date = date
+                break
+        preferred_time = "afternoon"
+        for slot in ["morning", "afternoon", "evening", "night"]:
+            if slot in text_lower:
+                preferred_time = slot
+                break
+        return ("appointment", preferred_date, preferred_time)
+    return None
+
+
+def measure(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in MESSAGES:
+            fn(message)
+    elapsed = time.perf_counter() - start
+    return iterations * len(MESSAGES) / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intent matcher microbenchmark")
+    parser.add_argument("--iterations", type=int, default=20000, help="Passes over the sample messages")
+    args = parser.parse_args()
+
+    legacy = measure(legacy_check, args.iterations)
+    compiled = measure(parse_message, args.iterations)
+    print(f"legacy keyword loops: {legacy:12,.0f} messages/sec")
+    print(f"compiled matcher:     {compiled:12,.0f} messages/sec  ({compiled / legacy:.2f}x)")
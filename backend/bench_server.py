@@ -0,0 +1,247 @@
+# bench_server.py
+"""In-process load test for the FastAPI endpoints in server.py.
+
+Drives the ASGI app directly through httpx (no network, no uvicorn) at
+increasing concurrency and reports throughput and p50/p95/p99 latency for
+these paths:
+
+    keyword         /ai/process-voice messages answered by rules/canned replies
+    classifier      /ai/diagnose with unique texts (cache misses, batched forward passes)
+    session         /ai/process-voice symptom reports spread over many session ids
+    voice-batch     the session workload sent to /ai/process-voice/batch
+    diagnose-batch  the classifier workload sent to /ai/diagnose/batch
+
+Batch scenarios send --items-per-request items per call; compare their
+items_per_s with the single-item scenarios' throughput.
+
+Without --model-dir the classifier is a stub with a fixed per-batch cost, and
+OPENAI_BASE_URL points at a local fake_openai server, so runs are reproducible
+on any machine. Results are written as JSON; pass --compare to diff against an
+earlier run:
+
+    python bench_server.py --out bench.json
+    python bench_server.py --out bench-new.json --compare bench.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+
+import httpx
+import numpy as np
+
+SCENARIOS = ("keyword", "classifier", "session", "voice-batch", "diagnose-batch")
+# Batch scenario -> (endpoint, single-item scenario whose payloads it batches)
+BATCH_SCENARIOS = {
+    "voice-batch": ("/ai/process-voice/batch", "session"),
+    "diagnose-batch": ("/ai/diagnose/batch", "classifier"),
+}
+
+KEYWORD_MESSAGES = [
+    "Can you book an appointment for tomorrow morning?",
+    "hello",
+    "Please connect me with my doctor",
+    "thank you",
+    "I'd like to schedule a visit with a specialist on friday afternoon",
+]
+SYMPTOM_MESSAGES = [
+    "I'm having a mild headache for 2 days",
+    "I have a fever and a cough",
+    "I'm experiencing severe chest pain",
+    "I have been feeling dizziness and nausea for a week",
+    "I have a sore throat since 3 days",
+]
+CLASSIFIER_MESSAGES = [
+    "I have itchy red patches on my elbows with silvery scales",
+    "My joints are stiff and swollen every morning",
+    "I keep getting a burning feeling in my chest after meals",
+    "I feel very thirsty and I urinate a lot",
+    "I have had high fever with chills and sweating every other day",
+]
+# Shared across levels and scenarios so no request text repeats within a run
+_SEQUENCE = itertools.count()
+
+
+class StubPredictor:
+    """Stands in for DiseasePredictor: fixed cost per forward pass plus a small cost per row."""
+
+    def __init__(self, batch_seconds: float = 0.01, row_seconds: float = 0.001) -> None:
+        self.diseases = [f"disease_{i}" for i in range(24)]
+        self.batch_seconds = batch_seconds
+        self.row_seconds = row_seconds
+        self.backend = "stub"
+        self.load_time = 0.0
+        self.tokens_processed = 0
+
+    def warmup(self):
+        pass
+
+    def predict_proba(self, texts, batch_size: int = 32):
+        texts = list(texts)
+        time.sleep(self.batch_seconds + self.row_seconds * len(texts))
+        rng = np.random.default_rng(abs(hash(tuple(texts))) % (2 ** 32))
+        return rng.random((len(texts), len(self.diseases)), dtype=np.float32)
+
+    def top_k(self, texts, k: int = 3):
+        probs = self.predict_proba(texts)
+        top = np.argsort(probs, axis=1)[:, -k:][:, ::-1]
+        return [[(self.diseases[i], float(row[i])) for i in ix] for row, ix in zip(probs, top)]
+
+
+def build_request(scenario: str, i: int):
+    if scenario == "keyword":
+        return "/ai/process-voice", {"inputText": KEYWORD_MESSAGES[i % len(KEYWORD_MESSAGES)], "sessionId": "bench-keyword"}
+    if scenario == "classifier":
+        # Suffix makes every text unique so the prediction cache does not hide the model cost
+        return "/ai/diagnose", {"inputText": f"{CLASSIFIER_MESSAGES[i % len(CLASSIFIER_MESSAGES)]} (case {i})"}
+    return "/ai/process-voice", {
+        "inputText": SYMPTOM_MESSAGES[i % len(SYMPTOM_MESSAGES)],
+        "sessionId": f"bench-user-{i % 1000}"
+    }
+
+
+def build_batch_request(scenario: str, items: int):
+    path, single = BATCH_SCENARIOS[scenario]
+    return path, [build_request(single, next(_SEQUENCE))[1] for _ in range(items)]
+
+
+async def run_level(client: httpx.AsyncClient, scenario: str, concurrency: int, requests: int,
+                    items_per_request: int = 1):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+    if scenario not in BATCH_SCENARIOS:
+        items_per_request = 1
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            if scenario in BATCH_SCENARIOS:
+                path, payload = build_batch_request(scenario, items_per_request)
+            else:
+                path, payload = build_request(scenario, next(_SEQUENCE))
+            start = time.perf_counter()
+            response = await client.post(path, json=payload)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += items_per_request
+            elif scenario in BATCH_SCENARIOS:
+                errors += sum("error" in result for result in response.json()["results"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "items_per_request": items_per_request,
+        "throughput_rps": round(requests / elapsed, 2),
+        "items_per_s": round(requests * items_per_request / elapsed, 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+async def run_benchmark(args):
+    import server
+
+    if not args.model_dir:
+        server.load_disease_predictor = lambda *a, **kw: StubPredictor(args.stub_batch_ms / 1000, args.stub_row_ms / 1000)
+    else:
+        server.MODEL_DIR = args.model_dir
+
+    results = {}
+    async with server.app.router.lifespan_context(server.app):
+        while server.model_status["state"] == "loading":
+            await asyncio.sleep(0.05)
+        if server.model_status["state"] != "ready":
+            raise SystemExit(f"Classifier failed to load: {server.model_status['error']}")
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in args.scenarios:
+                # Warm-up pass so imports, caches and pools are not billed to the first level
+                await run_level(client, scenario, 1, 5, args.items_per_request)
+                results[scenario] = []
+                # Batch scenarios carry many items per request; keep total items comparable
+                requests = args.requests
+                if scenario in BATCH_SCENARIOS:
+                    requests = max(1, args.requests // args.items_per_request)
+                for concurrency in args.concurrency:
+                    level = await run_level(client, scenario, concurrency, requests, args.items_per_request)
+                    results[scenario].append(level)
+                    print(f"{scenario:>14}  c={concurrency:<4} {level['items_per_s']:>9.1f} items/s  "
+                          f"p50 {level['p50_ms']:8.2f} ms  p95 {level['p95_ms']:8.2f} ms  "
+                          f"p99 {level['p99_ms']:8.2f} ms  errors {level['errors']}")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange vs {baseline_path} (items/s, p95):")
+    for scenario, levels in current.items():
+        previous = {level["concurrency"]: level for level in baseline.get(scenario, [])}
+        for level in levels:
+            old = previous.get(level["concurrency"])
+            if not old:
+                continue
+            rps = (level["items_per_s"] / old.get("items_per_s", old["throughput_rps"]) - 1) * 100
+            p95 = (level["p95_ms"] / old["p95_ms"] - 1) * 100
+            print(f"{scenario:>14}  c={level['concurrency']:<4} {rps:+7.1f}% items/s  {p95:+7.1f}% p95")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process load test for server.py")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64], help="Concurrency levels")
+    parser.add_argument("--requests", type=int, default=500,
+                        help="Items per concurrency level (batch scenarios send them in fewer requests)")
+    parser.add_argument("--items-per-request", type=int, default=32, help="Items per batch-scenario request")
+    parser.add_argument("--model-dir", help="Benchmark a real saved model instead of the stub classifier")
+    parser.add_argument("--stub-batch-ms", type=float, default=10.0, help="Stub cost per forward pass")
+    parser.add_argument("--stub-row-ms", type=float, default=1.0, help="Stub cost per row in a batch")
+    parser.add_argument("--out", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    fake_llm = None
+    if not os.getenv("OPENAI_BASE_URL"):
+        from fake_openai import FakeOpenAIServer
+
+        fake_llm = FakeOpenAIServer().start()
+        os.environ["OPENAI_BASE_URL"] = fake_llm.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    results = asyncio.run(run_benchmark(args))
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+    if fake_llm is not None:
+        fake_llm.shutdown()
@@ -0,0 +1,110 @@
+# context.py
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+# Fixed per-message overhead of the chat format (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, else a ~4 characters/token estimate."""
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def _condense(text: str, max_words: int = 25) -> str:
+    match = _FIRST_SENTENCE.match(text.strip())
+    sentence = match.group(1) if match else text.strip()
+    words = sentence.split()
+    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+
+
+class ConversationContext:
+    """Chat history kept under a fixed token budget.
+
+    The prompt is always the system prompt, one note carrying the recorded
+    symptoms and a rolling summary of older turns, then as many recent turns
+    as fit. Turns that no longer fit are condensed to one line each in the
+    summary, whose own size is capped, so the prompt size stays flat no
+    matter how long the session runs.
+    """
+
+    def __init__(self, system_prompt: str, max_tokens: int = 1500, summary_tokens: int = 250,
+                 symptom_tokens: int = 150) -> None:
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.symptom_tokens = symptom_tokens
+        self._turns: deque = deque()  # (role, content, tokens)
+        self._turn_tokens = 0
+        self._summary: deque = deque()  # (line, tokens)
+        self._summary_used = 0
+
+    @property
+    def turn_budget(self) -> int:
+        reserved = count_tokens(self.system_prompt) + self.summary_tokens + self.symptom_tokens
+        return max(0, self.max_tokens - reserved - 2 * MESSAGE_OVERHEAD_TOKENS)
+
+    def add(self, role: str, content: str):
+        tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        self._turns.append((role, content, tokens))
+        self._turn_tokens += tokens
+        # Always keep the newest turn, even if it alone is over budget
+        budget = self.turn_budget
+        while self._turn_tokens > budget and len(self._turns) > 1:
+            old_role, old_content, old_tokens = self._turns.popleft()
+            self._turn_tokens -= old_tokens
+            self._add_to_summary(f"{old_role}: {_condense(old_content)}")
+
+    def _add_to_summary(self, line: str):
+        tokens = count_tokens(line)
+        self._summary.append((line, tokens))
+        self._summary_used += tokens
+        while self._summary_used > self.summary_tokens and self._summary:
+            _, dropped = self._summary.popleft()
+            self._summary_used -= dropped
+
+    def _notes(self, symptoms: Optional[List[Dict[str, Any]]]) -> str:
+        notes = []
+        if symptoms:
+            # Latest entry per symptom, capped by the symptom token reserve
+            latest = {s["symptom"]: s for s in symptoms}
+            line = "Recorded symptoms: " + "; ".join(
+                f"{name} ({s['severity']}, {s['duration']})" for name, s in latest.items()
+            )
+            while count_tokens(line) > self.symptom_tokens and ";" in line:
+                line = line.rsplit(";", 1)[0]
+            notes.append(line)
+        if self._summary:
+            notes.append("Summary of earlier conversation:\n" + "\n".join(line for line, _ in self._summary))
+        return "\n\n".join(notes)
+
+    def messages(self, symptoms: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, str]]:
+        """Messages to send to the LLM: system prompt, notes, then the retained turns."""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        notes = self._notes(symptoms)
+        if notes:
+            messages.append({"role": "system", "content": notes})
+        messages.extend({"role": role, "content": content} for role, content, _ in self._turns)
+        return messages
+
+    def prompt_tokens(self, symptoms: Optional[List[Dict[str, Any]]] = None) -> int:
+        return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in self.messages(symptoms))
+
+    def __len__(self) -> int:
+        return len(self._turns)
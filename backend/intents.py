@@ -0,0 +1,203 @@
+# intents.py
+import enum
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from api import AssistantFnc, Severity, Symptom
+
+# Keyword tables: edit these to change what the assistant recognizes.
+# Every phrase is matched on a word start, so "cough" also catches "coughing".
+SYMPTOM_REPORT_KEYWORDS = ["symptom", "feeling", "experiencing", "having", "suffer", "i have"]
+ANALYSIS_KEYWORDS = ["diagnose", "diagnosis", "what do i have", "what could it be", "analyze", "analyse", "what's wrong"]
+RECOMMENDATION_KEYWORDS = ["recommend", "suggestion", "advice", "what should i do", "treatment", "help"]
+APPOINTMENT_KEYWORDS = ["appointment", "schedule", "book", "visit", "see a doctor"]
+CONNECT_KEYWORDS = ["doctor", "provider", "message", "connect"]
+SPECIALIST_KEYWORDS = ["specialist"]
+DATE_KEYWORDS = ["today", "tomorrow", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+TIME_KEYWORDS = ["morning", "afternoon", "evening", "night"]
+DURATION_UNITS = ["hour", "day", "week", "month", "year"]
+
+CONNECT_PROVIDER_REPLY = "Okay, connecting you with your provider through our secure messaging system."
+
+
+class Intent(enum.Enum):
+    RECORD_SYMPTOMS = "record_symptoms"
+    ANALYZE_SYMPTOMS = "analyze_symptoms"
+    GET_RECOMMENDATIONS = "get_recommendations"
+    SCHEDULE_APPOINTMENT = "schedule_appointment"
+    CONNECT_PROVIDER = "connect_provider"
+    UNKNOWN = "unknown"
+
+
+# Request categories checked in priority order once symptom reporting has been ruled out
+_INTENT_PRIORITY = [
+    ("analysis", Intent.ANALYZE_SYMPTOMS),
+    ("recommendation", Intent.GET_RECOMMENDATIONS),
+    ("appointment", Intent.SCHEDULE_APPOINTMENT),
+    ("connect", Intent.CONNECT_PROVIDER),
+]
+
+
+def _symptom_phrases(symptom: Symptom) -> List[str]:
+    # "sore_throat" should match "sore throat", "sore-throat" and "sore_throat"
+    words = symptom.value.split("_")
+    return [sep.join(words) for sep in (" ", "-", "_")] if len(words) > 1 else [symptom.value]
+
+
+def _build_phrase_table() -> Dict[str, Tuple[str, str]]:
+    table: Dict[str, Tuple[str, str]] = {}
+    for symptom in Symptom:
+        for phrase in _symptom_phrases(symptom):
+            table[phrase] = ("symptom", symptom.value)
+    for severity in Severity:
+        table[severity.value] = ("severity", severity.value)
+    groups = [
+        ("symptom_report", SYMPTOM_REPORT_KEYWORDS),
+        ("analysis", ANALYSIS_KEYWORDS),
+        ("recommendation", RECOMMENDATION_KEYWORDS),
+        ("appointment", APPOINTMENT_KEYWORDS),
+        ("connect", CONNECT_KEYWORDS),
+        ("specialist", SPECIALIST_KEYWORDS),
+        ("date", DATE_KEYWORDS),
+        ("time", TIME_KEYWORDS),
+        ("duration_unit", DURATION_UNITS),
+    ]
+    for category, phrases in groups:
+        for phrase in phrases:
+            table.setdefault(phrase, (category, phrase))
+    return table
+
+
+def _trie_pattern(phrases) -> str:
+    """Regex alternation of phrases factored by common prefix.
+
+    A flat "a|b|c" alternation retries every phrase at every word start; the
+    trie form dispatches on one character at a time. Phrase ends are optional
+    groups, so the longest phrase sharing a prefix wins.
+    """
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return render(trie)
+
+
+_PHRASES = _build_phrase_table()
+# One precompiled pattern for everything. Numeric durations come first so "3 days" is read as a
+# duration rather than the bare unit; the phrase branch is a prefix trie of every keyword.
+_MATCHER = re.compile(
+    r"\b(?:(?P<number>\d+)\s*(?P<unit>" + "|".join(DURATION_UNITS) + r")s?"
+    r"|(?P<phrase>" + _trie_pattern(_PHRASES) + r"))"
+)
+
+
+@dataclass
+class ParsedMessage:
+    """Intent plus everything the matcher found in one message, in order of first mention."""
+    intent: Intent = Intent.UNKNOWN
+    categories: Set[str] = field(default_factory=set)
+    symptoms: List[str] = field(default_factory=list)
+    severities: List[str] = field(default_factory=list)
+    durations: List[str] = field(default_factory=list)
+    dates: List[str] = field(default_factory=list)
+    times: List[str] = field(default_factory=list)
+
+    @property
+    def severity(self) -> Optional[str]:
+        return self.severities[0] if self.severities else None
+
+    @property
+    def duration(self) -> Optional[str]:
+        return self.durations[0] if self.durations else None
+
+    def entities(self) -> Dict[str, List[str]]:
+        return {
+            "symptoms": self.symptoms,
+            "severities": self.severities,
+            "durations": self.durations,
+            "dates": self.dates,
+            "times": self.times
+        }
+
+
+def _append_unique(values: List[str], value: str):
+    if value not in values:
+        values.append(value)
+
+
+def parse_message(text: str) -> ParsedMessage:
+    """Extract symptoms, severities, durations, dates and time slots in a single scan."""
+    parsed = ParsedMessage()
+    for match in _MATCHER.finditer(text.lower()):
+        number = match.group("number")
+        if number is not None:
+            unit = match.group("unit")
+            _append_unique(parsed.durations, f"{number} {unit}" + ("" if number == "1" else "s"))
+            continue
+
+        category, value = _PHRASES[match.group("phrase")]
+        parsed.categories.add(category)
+        if category == "symptom":
+            _append_unique(parsed.symptoms, value)
+        elif category == "severity":
+            _append_unique(parsed.severities, value)
+        elif category == "duration_unit":
+            _append_unique(parsed.durations, f"a {value}")
+        elif category == "date":
+            _append_unique(parsed.dates, value)
+        elif category == "time":
+            _append_unique(parsed.times, value)
+    # A bare unit ("for a week") only matters when no explicit number was given
+    if len(parsed.durations) > 1:
+        numeric = [d for d in parsed.durations if d[0].isdigit()]
+        parsed.durations = numeric or parsed.durations
+    parsed.intent = _resolve_intent(parsed)
+    return parsed
+
+
+def _resolve_intent(parsed: ParsedMessage) -> Intent:
+    categories = parsed.categories
+    # Symptoms count as a report when introduced as one ("I'm having...") or when nothing else was asked
+    if parsed.symptoms and (
+        "symptom_report" in categories or not any(c in categories for c, _ in _INTENT_PRIORITY)
+    ):
+        return Intent.RECORD_SYMPTOMS
+    for category, intent in _INTENT_PRIORITY:
+        if category in categories:
+            return intent
+    return Intent.UNKNOWN
+
+
+def dispatch(parsed: ParsedMessage, assistant_fnc: AssistantFnc) -> Optional[str]:
+    """Run the AssistantFnc call for a parsed message; None when no function applies."""
+    intent = parsed.intent
+    if intent is Intent.RECORD_SYMPTOMS:
+        severity = parsed.severity or Severity.MODERATE.value  # Default to moderate
+        duration = parsed.duration or "recently"
+        return " ".join(
+            assistant_fnc.record_symptom(symptom_name, severity, duration)
+            for symptom_name in parsed.symptoms
+        )
+    if intent is Intent.ANALYZE_SYMPTOMS:
+        return assistant_fnc.analyze_symptoms()
+    if intent is Intent.GET_RECOMMENDATIONS:
+        return assistant_fnc.get_recommendations()
+    if intent is Intent.SCHEDULE_APPOINTMENT:
+        provider_type = "specialist" if "specialist" in parsed.categories else "primary care"
+        preferred_date = parsed.dates[0] if parsed.dates else "tomorrow"
+        preferred_time = parsed.times[0] if parsed.times else "afternoon"
+        return assistant_fnc.schedule_appointment(provider_type, preferred_date, preferred_time)
+    if intent is Intent.CONNECT_PROVIDER:
+        return CONNECT_PROVIDER_REPLY
+    return None
@@ -0,0 +1,108 @@
+# llm.py
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+import openai
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("healthcare-llm")
+logger.setLevel(logging.INFO)
+
+# Point OPENAI_BASE_URL at fake_openai.py (e.g. http://127.0.0.1:8099/v1) to run without the real API
+LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+LLM_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+LLM_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+
+
+class LLMClient:
+    """One shared AsyncOpenAI client with a keep-alive connection pool.
+
+    Building the client once means every chat turn reuses pooled HTTP
+    connections instead of paying a fresh TLS handshake. Transient failures
+    (connection errors, 429, 5xx) are retried by the SDK with exponential
+    backoff, up to ``max_retries`` times, before any token is streamed.
+    """
+
+    def __init__(self, model: str = LLM_MODEL, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = LLM_TIMEOUT, connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, max_connections: int = LLM_MAX_CONNECTIONS) -> None:
+        self.model = model
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+            max_retries=max_retries,
+            http_client=openai.DefaultAsyncHttpxClient(
+                timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            ),
+        )
+        self.calls = 0
+        self.errors = 0
+        self.last_ttft = None
+        self._ttft_total = 0.0
+
+    async def stream_chat(self, messages: List[Dict[str, str]], max_tokens: int = 150,
+                          temperature: float = 0.7) -> AsyncIterator[str]:
+        """Yield completion text as it arrives, recording time-to-first-token."""
+        start = time.perf_counter()
+        self.calls += 1
+        first = True
+        try:
+            stream = await self._client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first:
+                    first = False
+                    self.last_ttft = time.perf_counter() - start
+                    self._ttft_total += self.last_ttft
+                    REGISTRY.observe_span("llm_first_token", self.last_ttft)
+                yield delta
+        except Exception:
+            self.errors += 1
+            REGISTRY.counter("llm_errors_total", "LLM calls that raised").inc()
+            raise
+        finally:
+            REGISTRY.observe_span("llm", time.perf_counter() - start)
+
+    async def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Convenience wrapper collecting the whole streamed completion."""
+        return "".join([chunk async for chunk in self.stream_chat(messages, **kwargs)])
+
+    def stats(self):
+        answered = self.calls - self.errors
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "last_ttft_ms": round(self.last_ttft * 1000, 2) if self.last_ttft is not None else None,
+            "mean_ttft_ms": round(self._ttft_total / answered * 1000, 2) if answered else None
+        }
+
+    async def aclose(self):
+        await self._client.close()
+
+
+_shared_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide LLMClient, created on first use."""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = LLMClient()
+    return _shared_client
@@ -0,0 +1,139 @@
+# metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond rule hits up to slow LLM round trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self) -> Dict[str, int]:
+        """Bucket upper bound -> number of observations <= that bound."""
+        result = {}
+        running = 0
+        for bound, count in zip(self.buckets, self._counts):
+            running += count
+            result[repr(bound)] = running
+        result["+Inf"] = running + self._counts[-1]
+        return result
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else None,
+            "buckets": self.cumulative()
+        }
+
+
+class Counter:
+    """Monotonic counter."""
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """Named counters and histograms, rendered in the Prometheus text format.
+
+    Metrics are created on first use and keyed by name plus labels, so hot
+    paths can call ``counter(...)`` / ``span(...)`` directly without holding
+    references. Existing histograms (e.g. ResponseRouter.latency) can be
+    exposed with ``register``.
+    """
+
+    def __init__(self, namespace: str = "healthcare") -> None:
+        self.namespace = namespace
+        self._families: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._metrics: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, str], factory):
+        key = tuple(sorted(labels.items()))
+        series = self._metrics.get(name)
+        metric = series.get(key) if series is not None else None
+        if metric is None:
+            with self._lock:
+                self._families.setdefault(name, (kind, help))
+                metric = self._metrics.setdefault(name, {}).setdefault(key, factory())
+        return metric
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        return self._get("counter", name, help, labels, Counter)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS,
+                  **labels: str) -> Histogram:
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def register(self, name: str, help: str, histogram: Histogram, **labels: str):
+        """Expose an existing histogram under name/labels."""
+        self._get("histogram", name, help, labels, lambda: histogram)
+
+    def observe_span(self, span: str, seconds: float):
+        self.histogram("span_seconds", "Time spent in instrumented hot-path stages", span=span).observe(seconds)
+
+    @contextmanager
+    def span(self, span: str):
+        """Time the enclosed block into span_seconds{span=...}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_span(span, time.perf_counter() - start)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            families = sorted(self._families.items())
+            series = {name: list(self._metrics[name].items()) for name, _ in families}
+        for name, (kind, help) in families:
+            full_name = f"{self.namespace}_{name}"
+            if help:
+                lines.append(f"# HELP {full_name} {help}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, metric in series[name]:
+                if kind == "counter":
+                    lines.append(f"{full_name}{_format_labels(labels)} {metric.value!r}")
+                    continue
+                buckets = metric.cumulative()
+                for bound, count in buckets.items():
+                    le = 'le="%s"' % bound
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, le)} {count}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {metric.sum!r}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {buckets['+Inf']}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by server.py's /metrics
+REGISTRY = MetricsRegistry()
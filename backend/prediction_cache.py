@@ -0,0 +1,180 @@
+# prediction_cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so near-duplicates share a key."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+def model_fingerprint(model_dir: str) -> str:
+    """Cheap identity of a model directory: names, sizes and mtimes of its files."""
+    parts = []
+    try:
+        for entry in sorted(os.scandir(model_dir), key=lambda e: e.name):
+            if entry.is_file():
+                st = entry.stat()
+                parts.append(f"{entry.name}:{st.st_size}:{st.st_mtime_ns}")
+    except FileNotFoundError:
+        return "missing"
+    # hashlib rather than hash(): the value must agree across worker processes
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+class PredictionCache:
+    """Bounded LRU + TTL cache of classifier results keyed on normalized text.
+
+    ``fingerprint`` identifies the weights this process actually loaded
+    (take it with model_fingerprint before loading the model). Once the model
+    directory stops matching it (checked at most every ``check_interval``
+    seconds) the process is serving stale weights: entries are dropped and
+    nothing more is cached, so old-model results never reach workers that
+    load the new files.
+
+    When ``db_path`` is set, results are also written to a SQLite table that
+    other uvicorn workers on the same host read from on a local miss. SQLite
+    waits at most ``db_timeout`` seconds for another worker's write lock; a
+    lookup that times out counts as a miss and a write that times out is
+    skipped.
+    """
+
+    def __init__(self, model_dir: str, max_size: int = 1024, ttl: float = 3600.0,
+                 db_path: Optional[str] = None, check_interval: float = 5.0, db_timeout: float = 0.05,
+                 fingerprint: Optional[str] = None) -> None:
+        self.model_dir = model_dir
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = fingerprint or model_fingerprint(model_dir)
+        self._checked_at = time.monotonic()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.disk_errors = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=db_timeout, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT, value TEXT, created REAL)"
+            )
+        # The files may have changed while the model was loading
+        self.stale = fingerprint is not None and model_fingerprint(model_dir) != fingerprint
+        if self._db is not None and not self.stale:
+            # Rows from other fingerprints can never be read again
+            self._execute("DELETE FROM predictions WHERE fingerprint != ?", (self._fingerprint,))
+
+    def _check_model_dir(self):
+        now = time.monotonic()
+        if self.stale or now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if model_fingerprint(self.model_dir) != self._fingerprint:
+            # Keep the loaded model's fingerprint: adopting the new one would label this
+            # process's old-weight results as the new model's in the shared tier
+            self.stale = True
+            self._entries.clear()
+            self.invalidations += 1
+
+    @property
+    def shared(self) -> bool:
+        """True when lookups may touch SQLite; async callers should then run them in a thread."""
+        return self._db is not None
+
+    def _execute(self, sql, params=()):
+        # Another worker holding the write lock past db_timeout is treated as "not cached"
+        try:
+            return self._db.execute(sql, params)
+        except sqlite3.OperationalError:
+            self.disk_errors += 1
+            return None
+
+    def get(self, text: str) -> Optional[Any]:
+        key = normalize_text(text)
+        with self._lock:
+            self._check_model_dir()
+            if self.stale:
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                cursor = self._execute(
+                    "SELECT value FROM predictions WHERE key = ? AND fingerprint = ? AND created > ?",
+                    (key, self._fingerprint, time.time() - self.ttl)
+                )
+                row = cursor.fetchone() if cursor is not None else None
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._store(key, value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, text: str, value: Any):
+        key = normalize_text(text)
+        with self._lock:
+            self._check_model_dir()
+            if self.stale:
+                return
+            self._store(key, value)
+            if self._db is not None:
+                self._execute(
+                    "INSERT OR REPLACE INTO predictions (key, fingerprint, value, created) VALUES (?, ?, ?, ?)",
+                    (key, self._fingerprint, json.dumps(value), time.time())
+                )
+
+    def _store(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale": self.stale,
+            "disk_errors": self.disk_errors,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,137 @@
+# router.py
+import logging
+import os
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+from api import AssistantFnc
+from intents import Intent, ParsedMessage, dispatch
+from metrics import Histogram
+from prediction_cache import normalize_text
+
+logger = logging.getLogger("healthcare-router")
+logger.setLevel(logging.INFO)
+
+AI_ASSISTANT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ai_assistant")
+
+# Tiers in the order they are tried; "llm" is the remote fallback handled by the caller
+TIERS = ("rules", "canned", "classifier", "llm")
+
+# Canned replies keyed by normalized text (see prediction_cache.normalize_text)
+CANNED_ANSWERS = {
+    "hi": "Hello! How can I help you with your health concerns today?",
+    "hello": "Hello! How can I help you with your health concerns today?",
+    "hey": "Hello! How can I help you with your health concerns today?",
+    "good morning": "Good morning! How can I help you with your health concerns today?",
+    "good evening": "Good evening! How can I help you with your health concerns today?",
+    "thanks": "You're welcome. Is there anything else I can help you with?",
+    "thank you": "You're welcome. Is there anything else I can help you with?",
+    "ok": "Is there anything else I can help you with?",
+    "okay": "Is there anything else I can help you with?",
+    "bye": "Goodbye! Take care of your health.",
+    "goodbye": "Goodbye! Take care of your health.",
+    "who are you": "I'm your healthcare voice assistant. I can record your symptoms, suggest possible causes, "
+                   "offer general advice and help you schedule an appointment.",
+    "what can you do": "I can record your symptoms, suggest possible causes, offer general advice "
+                       "and help you schedule an appointment or contact your provider.",
+}
+
+
+def load_disease_predictor(model_dir: Optional[str] = None, backend: str = "torch", num_threads: Optional[int] = None):
+    """Load ai_assistant/Model.py's DiseasePredictor from model_dir (default: ai_assistant/saved_model)."""
+    if AI_ASSISTANT_DIR not in sys.path:
+        sys.path.append(AI_ASSISTANT_DIR)
+    from Model import DiseasePredictor
+
+    predictor = DiseasePredictor(
+        model_dir or os.path.join(AI_ASSISTANT_DIR, "saved_model"), backend=backend, num_threads=num_threads
+    )
+    predictor.warmup()
+    return predictor
+
+
+def load_case_index(index_dir: str, predictor):
+    """Open a similar-case index written by `python Model.py index` (memory-mapped, read-only).
+
+    Raises ValueError when the index was built with a different model,
+    backend or embedding size than ``predictor`` serves.
+    """
+    if AI_ASSISTANT_DIR not in sys.path:
+        sys.path.append(AI_ASSISTANT_DIR)
+    from Model import CaseIndex
+
+    index = CaseIndex(index_dir)
+    index.check_compatible(predictor)
+    return index
+
+
+class ResponseRouter:
+    """Answer from the cheapest local tier that can, before falling back to the LLM.
+
+    Tiers: rule-based AssistantFnc functions, canned answers, then the
+    disease classifier when its top probability clears
+    ``confidence_threshold``. Every tier keeps a hit counter and a latency
+    histogram; the caller reports LLM calls through ``record("llm", ...)``.
+    """
+
+    def __init__(self, predictor=None, confidence_threshold: float = 0.6,
+                 canned_answers: Optional[Dict[str, str]] = None) -> None:
+        self.predictor = predictor
+        self.confidence_threshold = confidence_threshold
+        self.canned_answers = CANNED_ANSWERS if canned_answers is None else canned_answers
+        self.hits = {tier: 0 for tier in TIERS}
+        self.latency = {tier: Histogram() for tier in TIERS}
+
+    def record(self, tier: str, seconds: float):
+        self.hits[tier] += 1
+        self.latency[tier].observe(seconds)
+
+    def route_local(self, text: str, parsed: ParsedMessage,
+                    assistant_fnc: AssistantFnc) -> Tuple[Optional[str], Optional[str]]:
+        """Return (tier, response) from the first local tier that answers, or (None, None)."""
+        start = time.perf_counter()
+        tier, response = self.route_fast(text, parsed, assistant_fnc)
+        if response is None and self.wants_classifier(parsed):
+            disease, probability = self.predictor.top_k([text], 1)[0][0]
+            response = self.classifier_reply(disease, probability, time.perf_counter() - start)
+            tier = "classifier" if response else None
+        return tier, response
+
+    def route_fast(self, text: str, parsed: ParsedMessage,
+                   assistant_fnc: AssistantFnc) -> Tuple[Optional[str], Optional[str]]:
+        """Rules and canned answers only; cheap enough to run inline on any thread."""
+        start = time.perf_counter()
+        response = dispatch(parsed, assistant_fnc)
+        if response:
+            self.record("rules", time.perf_counter() - start)
+            return "rules", response
+
+        response = self.canned_answers.get(normalize_text(text))
+        if response:
+            self.record("canned", time.perf_counter() - start)
+            return "canned", response
+        return None, None
+
+    def wants_classifier(self, parsed: ParsedMessage) -> bool:
+        return self.predictor is not None and parsed.intent is Intent.UNKNOWN
+
+    def classifier_reply(self, disease: str, probability: float, seconds: float) -> Optional[str]:
+        """Reply for the classifier's top prediction, or None when it is below the threshold."""
+        if probability < self.confidence_threshold:
+            return None
+        self.record("classifier", seconds)
+        return (
+            f"From what you've described, one possible cause is {disease} "
+            f"({probability * 100:.0f}% confidence). This is not a diagnosis, "
+            "so please check with a healthcare provider."
+        )
+
+    def stats(self):
+        total = sum(self.hits.values())
+        local = total - self.hits["llm"]
+        return {
+            "hits": dict(self.hits),
+            "llm_calls_avoided_ratio": round(local / total, 4) if total else 0.0,
+            "latency": {tier: histogram.snapshot() for tier, histogram in self.latency.items()}
+        }
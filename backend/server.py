@@ -1,11 +1,146 @@
 # server.py
-from fastapi import FastAPI, Request
-from pydantic import BaseModel
+"""FastAPI backend for the healthcare voice assistant.
+
+Single worker:   uvicorn server:app --port 8000
+Multi-worker:    WEB_CONCURRENCY=4 MODEL_THREADS=2 python server.py
+                 (same as: uvicorn server:app --workers 4)
+
+Each worker is a separate process that loads and warms up its own copy of
+the classifier in the background after startup. /healthz answers as soon as
+the worker is serving; /readyz returns 503 until the model is loaded, so
+load balancers and orchestrators should route on /readyz. Keep
+WEB_CONCURRENCY * MODEL_THREADS at or below the number of cores. Sessions
+and the diagnosis cache are per worker unless SESSION_BACKEND=sqlite|redis
+and DIAGNOSE_CACHE_DB are set. /metrics (Prometheus text format) is also per
+worker; scrape each one or aggregate in Prometheus.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional
+
+from fastapi import Body, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, ValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from api import AssistantFnc
+from batching import MicroBatcher
+from intents import Intent, parse_message
+from metrics import REGISTRY
+from router import AI_ASSISTANT_DIR, TIERS, ResponseRouter, load_case_index, load_disease_predictor
+from prediction_cache import PredictionCache, model_fingerprint, normalize_text
+from sessions import create_session_store
+
+logger = logging.getLogger("healthcare-server")
+logger.setLevel(logging.INFO)
+
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(AI_ASSISTANT_DIR, "saved_model"))
+TOP_K = int(os.getenv("DIAGNOSE_TOP_K", "3"))
+# torch, onnx, int8 (ONNX graphs from `python Model.py export`) or student (from `python Model.py distill`)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch")
+# Forward passes run on a dedicated pool so they never block the event loop or the request threadpool;
+# MODEL_THREADS caps torch/ONNX Runtime intra-op threads per worker
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "0")) or None
+# Set REQUIRE_MODEL=0 to report ready even when the classifier could not be loaded
+REQUIRE_MODEL = os.getenv("REQUIRE_MODEL", "1") != "0"
+# Concurrent /ai/diagnose calls are grouped into one forward pass
+BATCH_WINDOW_MS = float(os.getenv("DIAGNOSE_BATCH_WINDOW_MS", "10"))
+MAX_BATCH_SIZE = int(os.getenv("DIAGNOSE_MAX_BATCH_SIZE", "32"))
+# Repeated symptom phrases are answered from an LRU/TTL cache; set DIAGNOSE_CACHE_DB
+# to a SQLite path to share results between uvicorn workers on one host
+CACHE_SIZE = int(os.getenv("DIAGNOSE_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("DIAGNOSE_CACHE_TTL", "3600"))
+CACHE_DB = os.getenv("DIAGNOSE_CACHE_DB")
+# Largest array accepted by the /batch endpoints
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "256"))
+# Similar-case index built with `python Model.py index`; /ai/similar-cases is 503 when it is missing
+CASE_INDEX_DIR = os.getenv("CASE_INDEX_DIR", os.path.join(MODEL_DIR, "case_index"))
+
+predictor = None
+# model_fingerprint(MODEL_DIR) taken just before the weights were read; the cache is tied to it
+loaded_fingerprint = None
+batcher = None
+prediction_cache = None
+case_index = None
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference")
+model_status = {"state": "loading", "error": None}
+# Rules and canned answers always; the classifier tier is attached once the model loads
+response_router = ResponseRouter(confidence_threshold=float(os.getenv("ASSISTANT_CLASSIFIER_THRESHOLD", "0.6")))
+for _tier in TIERS:
+    REGISTRY.register("router_tier_seconds", "Latency of requests answered by each router tier",
+                      response_router.latency[_tier], tier=_tier)
+
+
+def load_predictor():
+    """Load the disease classifier once and keep it warm for the process lifetime."""
+    global predictor, loaded_fingerprint
+    loaded_fingerprint = model_fingerprint(MODEL_DIR)
+    predictor = load_disease_predictor(MODEL_DIR, MODEL_BACKEND, MODEL_THREADS)
+    # Per-batch tokenize/forward timings land in span_seconds
+    predictor.timing_hook = REGISTRY.observe_span
+    response_router.predictor = predictor
+    logger.info("Loaded %s classifier from %s in %.2fs (pid %d)", MODEL_BACKEND, MODEL_DIR, predictor.load_time, os.getpid())
+
+
+async def load_model_in_background():
+    global batcher, prediction_cache
+    try:
+        await asyncio.get_running_loop().run_in_executor(inference_executor, load_predictor)
+    except Exception as e:
+        # Keep serving the keyword routes; /ai/diagnose reports 503 until a model is available
+        logger.error("Could not load classifier from %s: %s", MODEL_DIR, e)
+        model_status.update(state="failed", error=str(e))
+        return
 
-app = FastAPI()
-assistant = AssistantFnc()
+    batcher = MicroBatcher(
+        lambda texts: predictor.top_k(texts, TOP_K),
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_ms=BATCH_WINDOW_MS,
+        executor=inference_executor
+    )
+    batcher.start()
+    prediction_cache = PredictionCache(MODEL_DIR, max_size=CACHE_SIZE, ttl=CACHE_TTL, db_path=CACHE_DB,
+                                       fingerprint=loaded_fingerprint)
+    model_status["state"] = "ready"
+    await load_case_index_in_background()
+
+
+async def load_case_index_in_background():
+    global case_index
+    if not os.path.isdir(CASE_INDEX_DIR):
+        return
+    try:
+        case_index = await asyncio.get_running_loop().run_in_executor(
+            None, load_case_index, CASE_INDEX_DIR, predictor
+        )
+        logger.info("Loaded similar-case index with %d cases from %s", len(case_index), CASE_INDEX_DIR)
+    except ValueError as e:
+        # Built for another model or backend; /ai/similar-cases stays 503 rather than mixing embeddings
+        logger.error("Not serving similar-case index from %s: %s", CASE_INDEX_DIR, e)
+    except Exception as e:
+        logger.error("Could not load similar-case index from %s: %s", CASE_INDEX_DIR, e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_task = asyncio.create_task(load_model_in_background())
+    yield
+    if not load_task.done():
+        load_task.cancel()
+    if batcher is not None:
+        await batcher.stop()
+    inference_executor.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
+# Each caller gets its own AssistantFnc state; see sessions.py for SESSION_BACKEND options
+sessions = create_session_store()
 
 # Allow frontend requests (adjust origins for production)
 app.add_middleware(
@@ -18,40 +153,314 @@ app.add_middleware(
 
 class VoiceInput(BaseModel):
     inputText: str
+    sessionId: Optional[str] = None
 
-@app.post("/ai/process-voice")
-def process_voice(input_data: VoiceInput):
-    text = input_data.inputText.lower()
 
-    # Try matching keywords to functions
-    if any(keyword in text for keyword in ["headache", "fever", "cough", "sore throat"]):
-        assistant.record_symptom("headache", "moderate", "2 days")
-        response = assistant.analyze_symptoms()
-        actions = {"scheduleAppointment": False, "connectToProvider": False}
+class SimilarCasesInput(BaseModel):
+    inputText: str
+    k: int = 5
+    disease: Optional[str] = None
+
 
-    elif any(keyword in text for keyword in ["appointment", "schedule", "book", "visit"]):
-        response = assistant.schedule_appointment("primary care", "tomorrow", "morning")
-        actions = {"scheduleAppointment": True, "connectToProvider": False}
+def resolve_session_id(input_data: VoiceInput, request: Request) -> str:
+    """Explicit sessionId, then X-Session-Id, then the bearer token; otherwise a one-off session."""
+    if input_data.sessionId:
+        return input_data.sessionId
+    header = request.headers.get("x-session-id")
+    if header:
+        return header
+    auth = request.headers.get("authorization")
+    if auth:
+        return hashlib.sha256(auth.encode()).hexdigest()
+    return uuid.uuid4().hex
 
-    elif any(keyword in text for keyword in ["doctor", "provider", "message", "connect"]):
-        response = "Okay, connecting you with your provider through our secure messaging system."
-        actions = {"scheduleAppointment": False, "connectToProvider": True}
+def route_in_session(session_id: str, text: str, parsed):
+    # Session locks and store I/O block, so this runs on the request threadpool
+    with sessions.session(session_id) as assistant:
+        tier, response = response_router.route_fast(text, parsed, assistant)
+        if parsed.intent is Intent.RECORD_SYMPTOMS:
+            with REGISTRY.span("symptom_analysis"):
+                response += " " + assistant.analyze_symptoms()
+    return tier, response
 
-    else:
-        response = "I'm not sure how to help with that. Could you describe your symptoms or ask to schedule an appointment?"
-        actions = {"scheduleAppointment": False, "connectToProvider": False}
 
+async def cache_call(fn, *args):
+    """Run a prediction_cache method, off the event loop when it may do SQLite I/O (DIAGNOSE_CACHE_DB)."""
+    if prediction_cache.shared:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+def cache_get_many(texts):
+    return [prediction_cache.get(text) for text in texts]
+
+
+def cache_set_many(pairs):
+    for text, top in pairs:
+        prediction_cache.set(text, top)
+
+
+async def predict_top_k(text: str):
+    """Top-k diseases for one text via the cache, else the micro-batcher; returns (top, cached)."""
+    top = await cache_call(prediction_cache.get, text)
+    if top is not None:
+        REGISTRY.counter("diagnose_cache_total", "Prediction cache lookups", result="hit").inc()
+        return top, True
+    REGISTRY.counter("diagnose_cache_total", "Prediction cache lookups", result="miss").inc()
+    top = await batcher.submit(text)
+    await cache_call(prediction_cache.set, text, top)
+    return top, False
+
+
+async def predict_top_k_many(texts: List[str]):
+    """predict_top_k for a whole batch: cache lookups, then one forward pass over the missed cache keys."""
+    results = await cache_call(cache_get_many, texts)
+    # Group misses by cache key: texts that normalize alike get one prediction, as they would via the cache
+    keys = [normalize_text(text) for text in texts]
+    misses = {}
+    for text, key, top in zip(texts, keys, results):
+        if top is None:
+            misses.setdefault(key, text)
+    # Count per item, as the response's "cached" flags do; repeats of a miss are misses too
+    hits = sum(top is not None for top in results)
+    REGISTRY.counter("diagnose_cache_total", "Prediction cache lookups", result="hit").inc(hits)
+    REGISTRY.counter("diagnose_cache_total", "Prediction cache lookups", result="miss").inc(len(texts) - hits)
+    fresh = {}
+    if misses:
+        miss_texts = list(misses.values())
+        tops = await asyncio.get_running_loop().run_in_executor(inference_executor, predictor.top_k, miss_texts, TOP_K)
+        fresh = dict(zip(misses, tops))
+        await cache_call(cache_set_many, list(zip(miss_texts, tops)))
+    return [(top, True) if top is not None else (fresh[key], False) for key, top in zip(keys, results)]
+
+
+def validate_batch(items: List[Any], model):
+    """Validate each array element on its own; returns (inputs, errors) with None in the other list's slot."""
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    inputs, errors = [], []
+    for item in items:
+        try:
+            inputs.append(model.model_validate(item))
+            errors.append(None)
+        except ValidationError as e:
+            inputs.append(None)
+            errors.append({"error": {"type": "validation", "detail": e.errors(include_url=False)}})
+    return inputs, errors
+
+
+UNKNOWN_REPLY = "I'm not sure how to help with that. Could you describe your symptoms or ask to schedule an appointment?"
+
+
+def voice_response(parsed, tier, response, session_id):
     return {
         "response": {
-            "text": response,
-            "intent": "parsed_input",
-            "actions": actions
-        }
+            "text": response if response is not None else UNKNOWN_REPLY,
+            "intent": parsed.intent.value,
+            "tier": tier,
+            "entities": parsed.entities(),
+            "actions": {
+                "scheduleAppointment": parsed.intent is Intent.SCHEDULE_APPOINTMENT,
+                "connectToProvider": parsed.intent is Intent.CONNECT_PROVIDER
+            }
+        },
+        "sessionId": session_id
     }
 
+
+@app.post("/ai/process-voice")
+async def process_voice(input_data: VoiceInput, request: Request):
+    REGISTRY.counter("requests_total", "Requests by endpoint", endpoint="process-voice").inc()
+    session_id = resolve_session_id(input_data, request)
+    with REGISTRY.span("intent_parse"):
+        parsed = parse_message(input_data.inputText)
+    tier, response = await run_in_threadpool(route_in_session, session_id, input_data.inputText, parsed)
+
+    if response is None and batcher is not None and response_router.wants_classifier(parsed):
+        start = time.perf_counter()
+        try:
+            top, _ = await predict_top_k(input_data.inputText)
+        except Exception as e:
+            # Classifier is an optional tier: the session update stands, fall back to the generic reply
+            logger.error("Classification failed in session %s: %s", session_id, e)
+            top = None
+        if top is not None:
+            disease, probability = top[0]
+            response = response_router.classifier_reply(disease, probability, time.perf_counter() - start)
+            tier = "classifier" if response else None
+
+    return voice_response(parsed, tier, response, session_id)
+
+
+def route_batch_in_sessions(work):
+    # Items run in input order so several utterances for one session apply in sequence
+    routed = []
+    for session_id, text, parsed in work:
+        try:
+            routed.append(route_in_session(session_id, text, parsed))
+        except Exception as e:
+            logger.error("Batch item failed in session %s: %s", session_id, e)
+            routed.append(e)
+    return routed
+
+
+@app.post("/ai/process-voice/batch")
+async def process_voice_batch(request: Request, items: List[Any] = Body(...)):
+    """Many utterances in one request; results come back in input order, with per-item errors."""
+    REGISTRY.counter("requests_total", "Requests by endpoint", endpoint="process-voice-batch").inc()
+    start = time.perf_counter()
+    inputs, results = validate_batch(items, VoiceInput)
+    valid = [i for i, item in enumerate(inputs) if item is not None]
+
+    session_ids = {i: resolve_session_id(inputs[i], request) for i in valid}
+    with REGISTRY.span("intent_parse"):
+        parsed = {i: parse_message(inputs[i].inputText) for i in valid}
+    routed = await run_in_threadpool(
+        route_batch_in_sessions, [(session_ids[i], inputs[i].inputText, parsed[i]) for i in valid]
+    )
+    routed = dict(zip(valid, routed))
+
+    # Everything the local tiers could not answer goes through the classifier as one batch
+    pending = [i for i in valid if not isinstance(routed[i], Exception) and routed[i][1] is None
+               and batcher is not None and response_router.wants_classifier(parsed[i])]
+    if pending:
+        classify_start = time.perf_counter()
+        try:
+            tops = await predict_top_k_many([inputs[i].inputText for i in pending])
+        except Exception as e:
+            logger.error("Batch classification of %d items failed: %s", len(pending), e)
+            tops = [(None, False)] * len(pending)
+        seconds = (time.perf_counter() - classify_start) / len(pending)
+        for i, (top, _) in zip(pending, tops):
+            if top is None:
+                # Classifier is an optional tier: fall back to the generic reply
+                continue
+            disease, probability = top[0]
+            reply = response_router.classifier_reply(disease, probability, seconds)
+            routed[i] = ("classifier" if reply else None, reply)
+
+    for i in valid:
+        if isinstance(routed[i], Exception):
+            results[i] = {"error": {"type": "internal", "detail": str(routed[i])}}
+        else:
+            tier, response = routed[i]
+            results[i] = voice_response(parsed[i], tier, response, session_ids[i])
+    return {"results": results, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
 @app.post("/ai/diagnose")
-def diagnose(input_data: VoiceInput):
-    # Dummy diagnosis logic (replace with actual model if needed)
+async def diagnose(input_data: VoiceInput):
+    REGISTRY.counter("requests_total", "Requests by endpoint", endpoint="diagnose").inc()
+    if batcher is None:
+        raise HTTPException(status_code=503, detail="Diagnosis model is not loaded")
+
+    start = time.perf_counter()
+    top, cached = await predict_top_k(input_data.inputText)
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "diagnoses": [disease for disease, _ in top],
+        "predictions": [{"disease": disease, "probability": prob} for disease, prob in top],
+        "latency_ms": round(latency_ms, 2),
+        "model_load_seconds": round(predictor.load_time, 2),
+        "backend": predictor.backend,
+        "cached": cached
+    }
+
+
+@app.post("/ai/similar-cases")
+async def similar_cases(input_data: SimilarCasesInput):
+    if case_index is None:
+        raise HTTPException(status_code=503, detail="Similar-case index is not loaded")
+    if input_data.disease is not None and input_data.disease not in case_index.diseases:
+        raise HTTPException(status_code=422, detail=f"Unknown disease {input_data.disease!r}")
+
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        with REGISTRY.span("embed"):
+            query = await loop.run_in_executor(inference_executor, predictor.embed, [input_data.inputText])
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    with REGISTRY.span("case_search"):
+        matches = await loop.run_in_executor(
+            None, case_index.similar, query, max(1, min(input_data.k, 50)), input_data.disease
+        )
+    return {
+        "cases": matches[0],
+        "indexed_cases": len(case_index),
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+
+
+@app.post("/ai/diagnose/batch")
+async def diagnose_batch(items: List[Any] = Body(...)):
+    """Top-k diagnoses for many texts in one forward pass; results in input order, with per-item errors."""
+    REGISTRY.counter("requests_total", "Requests by endpoint", endpoint="diagnose-batch").inc()
+    if batcher is None:
+        raise HTTPException(status_code=503, detail="Diagnosis model is not loaded")
+
+    start = time.perf_counter()
+    inputs, results = validate_batch(items, VoiceInput)
+    valid = [i for i, item in enumerate(inputs) if item is not None]
+    try:
+        tops = await predict_top_k_many([inputs[i].inputText for i in valid]) if valid else []
+    except Exception as e:
+        logger.error("Batch diagnosis of %d items failed: %s", len(valid), e)
+        tops = [(None, False)] * len(valid)
+    for i, (top, cached) in zip(valid, tops):
+        if top is None:
+            results[i] = {"error": {"type": "internal", "detail": "Diagnosis failed"}}
+            continue
+        results[i] = {
+            "diagnoses": [disease for disease, _ in top],
+            "predictions": [{"disease": disease, "probability": prob} for disease, prob in top],
+            "cached": cached
+        }
     return {
-        "diagnoses": ["Common Cold", "Flu"] if "fever" in input_data.inputText.lower() else ["Unclear – further analysis needed"]
+        "results": results,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+        "backend": predictor.backend
     }
+
+
+@app.get("/healthz")
+async def liveness():
+    return {"status": "alive", "pid": os.getpid()}
+
+
+@app.get("/readyz")
+async def readiness():
+    ready = model_status["state"] == "ready" or (model_status["state"] == "failed" and not REQUIRE_MODEL)
+    if not ready:
+        raise HTTPException(status_code=503, detail=dict(model_status, pid=os.getpid()))
+    return dict(model_status, pid=os.getpid())
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Counters and latency histograms in the Prometheus text exposition format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ai/router/stats")
+async def router_stats():
+    return response_router.stats()
+
+
+@app.get("/ai/diagnose/cache")
+async def diagnose_cache_stats():
+    if prediction_cache is None:
+        raise HTTPException(status_code=503, detail="Diagnosis model is not loaded")
+    return prediction_cache.stats()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "server:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
@@ -0,0 +1,139 @@
+# sessions.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from api import AssistantFnc
+
+
+class InMemorySessionStore:
+    """Per-session AssistantFnc instances held in this process.
+
+    Sessions are kept in least-recently-used order, so idle eviction only
+    ever looks at the front of the dict: each request costs O(1) plus the
+    number of sessions it evicts, however many users are connected.
+    """
+
+    def __init__(self, ttl: float = 1800.0, max_sessions: int = 10000) -> None:
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()  # id -> [assistant, lock, last_seen]
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[AssistantFnc]:
+        """Yield the session's AssistantFnc while holding that session's lock."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = [AssistantFnc(), threading.Lock(), now]
+                self._sessions[session_id] = entry
+            else:
+                entry[2] = now
+                self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+        with entry[1]:
+            yield entry[0]
+
+    def _evict(self, now: float):
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry[2] <= self.ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteKV:
+    """Minimal Redis-style get/set/delete over SQLite.
+
+    Stands in for a Redis client on single-host deployments and in local
+    testing; use ``":memory:"`` for a throwaway store.
+    """
+
+    def __init__(self, path: str = ":memory:", purge_every: int = 1000) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+        self._lock = threading.Lock()
+        self._purge_every = purge_every
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ex: Optional[float] = None):
+        expires = time.time() + ex if ex else None
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+            self._writes += 1
+            if self._writes % self._purge_every == 0:
+                self._db.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+class KeyValueSessionStore:
+    """Session state serialized into a Redis-compatible client (redis.Redis or SQLiteKV).
+
+    Idle sessions expire through the client's TTL. The per-session lock only
+    serializes requests within this process; across workers the last write wins.
+    """
+
+    def __init__(self, client, ttl: float = 1800.0, prefix: str = "assistant-session:") -> None:
+        self._client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[session_id] = lock
+            return lock
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[AssistantFnc]:
+        key = self.prefix + session_id
+        with self._lock_for(session_id):
+            raw = self._client.get(key)
+            assistant = AssistantFnc.from_state(json.loads(raw)) if raw else AssistantFnc()
+            yield assistant
+            self._client.set(key, json.dumps(assistant.to_state()), ex=int(self.ttl))
+
+
+def create_session_store():
+    """Build the store selected by SESSION_BACKEND (memory, sqlite or redis)."""
+    backend = os.getenv("SESSION_BACKEND", "memory")
+    ttl = float(os.getenv("SESSION_TTL", "1800"))
+    if backend == "memory":
+        return InMemorySessionStore(ttl=ttl, max_sessions=int(os.getenv("SESSION_MAX", "10000")))
+    if backend == "sqlite":
+        return KeyValueSessionStore(SQLiteKV(os.getenv("SESSION_DB", "sessions.db")), ttl=ttl)
+    if backend == "redis":
+        import redis
+
+        return KeyValueSessionStore(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")), ttl=ttl)
+    raise ValueError(f"Unknown SESSION_BACKEND {backend!r}, expected memory, sqlite or redis")